@@ -1,6 +1,58 @@
 import logging
 
 
+class _LazyFormat:
+    """Message formatted with str.format only when a handler emits it. The
+    result is kept, so that several handlers format it once.
+    """
+    __slots__ = ('msg', 'args', 'text')
+
+    def __init__(self, msg, args):
+        self.msg = msg
+        self.args = args
+        self.text = None
+
+    def __str__(self):
+        if self.text is None:
+            self.text = self.msg.format(*self.args)
+        return self.text
+
+
+def _get_handler_levels(logger):
+    """Handlers that receive records of logger and their levels, following
+    propagation to parents as logging.Logger.callHandlers does.
+
+    Args:
+        logger (Logger): logger.
+
+    Returns:
+        tuple: (id of handler, level of handler) of handlers.
+    """
+    levels = []
+    current = logger
+    while current:
+        levels += [(id(handler), handler.level)
+                   for handler in current.handlers]
+        if not current.propagate:
+            break
+        current = current.parent
+    return tuple(levels)
+
+
+def _get_min_level(handler_levels):
+    """Lowest level of handlers.
+
+    Args:
+        handler_levels (tuple): handlers and levels from _get_handler_levels.
+
+    Returns:
+        int: level, logging.lastResort level if there are no handlers.
+    """
+    if not handler_levels:
+        return logging.lastResort.level if logging.lastResort else 100
+    return min(level for _, level in handler_levels)
+
+
 class CustomLogger:
     """Logger that handles string formatting.
 
@@ -8,7 +60,10 @@ class CustomLogger:
     methods. The purpose is to accept str.format() style formatting.
     With this custom class, messages may contain '{}' where the next
     arguments will be placed. Doesn't work with keyword arguments for the
-    formatting.
+    formatting. Messages below the level of all handlers are dropped before
+    formatting, and formatting of other messages is deferred until they are
+    emitted. The lowest level of handlers is recomputed when handlers or their
+    levels change, however they are configured.
 
     Examples
     --------
@@ -19,6 +74,9 @@ class CustomLogger:
     def __init__(self, name):
         self.logger = logging.getLogger(name)
         self.logger.setLevel(5)
+        # lowest level of handlers and handlers it was computed for
+        self.min_level = 0
+        self.handler_levels = None
 
     def debug(self, msg, *args, **kwargs):
         self.log(logging.DEBUG, msg, *args, **kwargs)
@@ -35,13 +93,24 @@ class CustomLogger:
     def critical(self, msg, *args, **kwargs):
         self.log(logging.CRITICAL, msg, *args, **kwargs)
 
+    def get_min_level(self):
+        """Lowest level of handlers, recomputed when handlers change."""
+        handler_levels = _get_handler_levels(self.logger)
+        if handler_levels != self.handler_levels:
+            self.min_level = _get_min_level(handler_levels)
+            self.handler_levels = handler_levels
+        return self.min_level
+
     def log(self, level, msg, *args, **kwargs):
-        if self.logger.isEnabledFor(level):
-            msg = msg.format(*args)
-            self.logger._log(level, msg, args=(), **kwargs)
+        if level >= self.get_min_level() and self.logger.isEnabledFor(level):
+            self.logger._log(level, _LazyFormat(msg, args), args=(),
+                             **kwargs)
 
 
 from .logmod import logs  # noqa E402
 from . import common  # noqa E402
 from . import settings  # noqa E402
+from . import instrument  # noqa E402
+from . import progress  # noqa E402
+from . import compression  # noqa E402
 from . import analysis  # noqa E402
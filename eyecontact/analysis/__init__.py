@@ -1,3 +1,10 @@
+from . import bands  # noqa
+from . import decimate  # noqa
+from . import mongo  # noqa
+from . import fingerprint  # noqa
+from . import stimuli  # noqa
+from .correlation import RunningCorr  # noqa
+from .participants import Participants  # noqa
 from .analysis import Analysis  # noqa
 from .appen import Appen  # noqa
 from .heroku import Heroku  # noqa
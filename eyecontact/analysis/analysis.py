@@ -1,9 +1,18 @@
 # by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
 import os
+import gzip
+import json
+import hashlib
+import pickle
+import inspect
+import functools
+import sys
+import time
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
-import scipy.stats as st
 import seaborn as sns
 import pandas as pd
 import plotly as py
@@ -13,12 +22,217 @@ from plotly import subplots
 import warnings
 import unicodedata
 import re
+import html
+from urllib.parse import quote
 
 import eyecontact as cs
 
-matplotlib.use('TkAgg')
 logger = cs.CustomLogger(__name__)  # use custom logger
 
+# page for browsing figures in the output folder. figures are loaded on click
+INDEX_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Figures</title>
+<style>
+body { display: flex; margin: 0; height: 100vh; font-family: serif; }
+#list { width: 300px; overflow-y: auto; padding: 10px; }
+#view { flex: 1; }
+#view iframe, #view div { width: 100%; height: 100%; border: none; }
+</style>
+</head>
+<body>
+<ul id="list">
+{items}
+</ul>
+<div id="view"></div>
+<script>
+// load plotly.js only once a json figure is opened
+function loadPlotly() {
+  if (window.Plotly) return Promise.resolve();
+  return new Promise(function(resolve, reject) {
+    var script = document.createElement('script');
+    script.src = 'plotly.min.js';
+    script.onload = resolve;
+    script.onerror = reject;
+    document.head.appendChild(script);
+  });
+}
+function showFigure(file, type) {
+  var view = document.getElementById('view');
+  view.innerHTML = '';
+  if (type === 'html') {
+    var frame = document.createElement('iframe');
+    frame.src = file;
+    view.appendChild(frame);
+    return;
+  }
+  var div = document.createElement('div');
+  view.appendChild(div);
+  Promise.all([loadPlotly(), fetch(file)]).then(function(res) {
+    var stream = res[1].body.pipeThrough(new DecompressionStream('gzip'));
+    return new Response(stream).json();
+  }).then(function(fig) {
+    Plotly.newPlot(div, fig.data, fig.layout);
+  });
+}
+document.querySelectorAll('#list a').forEach(function(a) {
+  a.addEventListener('click', function(e) {
+    e.preventDefault();
+    showFigure(a.dataset.file, a.dataset.type);
+  });
+});
+</script>
+</body>
+</html>
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def pretty_label(value):
+    """
+    Pretty label for value in plots: underscores replaced with spaces and
+    first letter capitalised. Cached, so that each distinct value is
+    processed once for all figures.
+
+    Args:
+        value (str): value to prettify.
+
+    Returns:
+        str: pretty label.
+    """
+    return value.replace('_', ' ').capitalize()
+
+
+def export_figure(kind, payload, path, formats, pad_inches=0):
+    """
+    Write figure to static files. Runs in worker processes of
+    Analysis.export_static, so the figure is given in serialised form.
+
+    Args:
+        kind (str): 'plotly' for plotly figure given as json, 'matplotlib' for
+                    pickled matplotlib figure.
+        payload (str or bytes): serialised figure.
+        path (str): path of output files without extension.
+        formats (list): formats of files, e.g. ['png', 'svg', 'pdf'].
+        pad_inches (int, optional): padding of matplotlib figures.
+
+    Returns:
+        list of dicts: file, time of export in seconds and error, if any, for
+                       each format.
+    """
+    report = []
+    if kind == 'matplotlib':
+        # workers never show figures
+        plt.switch_backend('Agg')
+        fig = pickle.loads(payload)
+    else:
+        fig = py.io.from_json(payload)
+    for fmt in formats:
+        file_static = path + '.' + fmt
+        start = time.perf_counter()
+        error = None
+        try:
+            if kind == 'matplotlib':
+                fig.savefig(file_static,
+                            bbox_inches='tight',
+                            pad_inches=pad_inches)
+            else:
+                fig.write_image(file_static)
+        except Exception as e:
+            error = repr(e)
+        report.append({'file': file_static,
+                       'kind': kind,
+                       'format': fmt,
+                       'time': time.perf_counter() - start,
+                       'error': error})
+    if kind == 'matplotlib':
+        plt.close(fig)
+    return report
+
+
+def get_code_hash(cls, method):
+    """
+    Hash of source code of method and of methods of cls that it calls,
+    directly or through other methods, so that edits to plotting code change
+    fingerprints of figures.
+
+    Args:
+        cls (type): class of method.
+        method (function): method.
+
+    Returns:
+        str: hex digest.
+    """
+    h = hashlib.sha1()
+    seen = set()
+    pending = [method]
+    while pending:
+        func = inspect.unwrap(pending.pop())
+        if func in seen:
+            continue
+        seen.add(func)
+        try:
+            source = inspect.getsource(func)
+        except (OSError, TypeError):
+            # source not available, e.g. in frozen applications
+            source = repr(getattr(func, '__code__', func))
+        h.update(source.encode())
+        # methods called on self
+        for name in sorted(set(re.findall(r'self\.(\w+)\(', source))):
+            attr = getattr(cls, name, None)
+            if callable(attr):
+                pending.append(attr)
+    return h.hexdigest()
+
+
+def cached_figure(method):
+    """
+    Decorator for plotting methods of Analysis. The input data, arguments of
+    the call and source code of the method (with methods it calls) are
+    fingerprinted; if the figure with the same fingerprint was saved before
+    and its files still exist, building and saving the figure is skipped.
+    Only calls with save_file=True are cached. Each call is recorded as a
+    stage of instrumentation.
+    """
+    # signature for resolving default values of arguments
+    signature = inspect.signature(method)
+    # hash of source code, computed on first call
+    code = {}
+
+    @functools.wraps(method)
+    @cs.instrument.stage('analysis.' + method.__name__)
+    def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        params = dict(bound.arguments)
+        params.pop('self')
+        # figures shown in the browser are not cached
+        if not params.get('save_file'):
+            return method(self, *args, **kwargs)
+        if 'hash' not in code:
+            code['hash'] = get_code_hash(type(self), method)
+        key = self.fingerprint(method.__name__, params, code['hash'])
+        files = self.figure_cache.get(key)
+        if (not self.force_refresh and files
+                and all(os.path.exists(f) for f in files)):
+            logger.info('Skipping {}: figure is up to date.',
+                        method.__name__)
+            return None
+        # record files written while building the figure
+        self.saved_files = []
+        result = method(self, *args, **kwargs)
+        if self.saved_files:
+            # forget fingerprints of older versions of the same files
+            for old_key, old_files in list(self.figure_cache.items()):
+                if set(old_files) & set(self.saved_files):
+                    del self.figure_cache[old_key]
+            self.figure_cache[key] = self.saved_files
+            self.save_figure_cache()
+        return result
+    return wrapper
+
 
 # todo: add optinal arguments to pass axis labels
 class Analysis:
@@ -30,25 +244,82 @@ class Analysis:
     num_stimuli = cs.common.get_configs('num_stimuli')
     # folder for output
     folder = '/figures/'
+    # folder for static files written by export_static
+    folder_static = '/figures/static/'
+    # supported modes for saving plotly figures
+    output_modes = ['html', 'shared', 'json']
+    # json file with fingerprints of saved figures
+    file_figure_cache = 'figure_cache.json'
 
-    def __init__(self):
+    def __init__(self, output_mode='html', force_refresh=False,
+                 n_resamples=1000, seed=None, n_jobs=1, max_points=10000,
+                 density_bins=100, kp_max_points=None, kp_decimation='lttb',
+                 headless=None, static_formats=None):
+        # backend of matplotlib
+        self.set_backend(headless)
         # set font to Times
         plt.rc('font', family='serif')
+        # mode for saving plotly figures. 'html': self-contained html files
+        # with plotly.js inlined; 'shared': html files referencing a single
+        # copy of plotly.min.js in the output folder; 'json': only gzipped
+        # figure json, viewed through the index page
+        if output_mode not in self.output_modes:
+            raise ValueError('Unknown output mode {}. Use one of {}.'.format(
+                output_mode, self.output_modes))
+        self.output_mode = output_mode
+        # rebuild figures even if their input data did not change
+        self.force_refresh = force_refresh
+        # fingerprints of saved figures with lists of their files
+        self.figure_cache = self.load_figure_cache()
+        # files written by the figure currently being built
+        self.saved_files = []
+        # number of resamples for bootstrap confidence intervals
+        self.n_resamples = n_resamples
+        # seed for bootstrap confidence intervals
+        self.seed = seed
+        # number of worker processes for bootstrap confidence intervals
+        self.n_jobs = n_jobs
+        # number of points above which scatter plots and heatmaps switch to
+        # rendering for large data. None to never switch
+        self.max_points = max_points
+        # number of bins on each axis of density tiles
+        self.density_bins = density_bins
+        # budget of points for each trace in keypress figures. None to keep
+        # all points
+        self.kp_max_points = kp_max_points
+        # method of decimation of keypress traces: 'lttb' or 'minmax'
+        if kp_decimation not in cs.analysis.decimate.methods:
+            raise ValueError('Unknown decimation method {}. Use one of {}.'
+                             .format(kp_decimation,
+                                     cs.analysis.decimate.methods))
+        self.kp_decimation = kp_decimation
+        # formats of static files written by export_static, e.g. ['png']
+        self.static_formats = static_formats or []
+        # figures waiting for static export
+        self.export_queue = []
 
-    def corr_matrix(self, df, columns_drop, save_file=False):
+    @cached_figure
+    def corr_matrix(self, df, columns_drop, corr=None, save_file=False):
         """
         Output correlation matrix.
 
         Args:
-            df (dataframe): mapping dataframe.
+            df (dataframe): mapping dataframe. Can be None if corr is given.
             columns_drop (list): columns dataframes in to ignore.
+            corr (RunningCorr, optional): statistics updated with data
+                                          beforehand. If None, correlation
+                                          is calculated from df.
             save_file (bool, optional): flag for saving an html file with plot.
         """
         logger.info('Creating correlation matrix.')
-        # drop columns
-        df = df.drop(columns_drop, 1)
         # create correlation matrix
-        corr = df.corr()
+        if corr is None:
+            corr = cs.analysis.RunningCorr().update(df)
+        corr = corr.corr()
+        # drop columns
+        corr = corr.drop(index=columns_drop,
+                         columns=columns_drop,
+                         errors='ignore')
         # create mask
         mask = np.zeros_like(corr)
         mask[np.triu_indices_from(mask)] = True
@@ -84,9 +355,11 @@ class Analysis:
         # revert font
         self.reset_font()
 
+    @cached_figure
     def scatter_matrix(self, df, columns_drop, color=None, symbol=None,
                        diagonal_visible=False, xaxis_title=None,
-                       yaxis_title=None, save_file=False):
+                       yaxis_title=None, nbins=30, max_dimensions=None,
+                       corr=None, save_file=False):
         """
         Output scatter matrix.
 
@@ -100,6 +373,16 @@ class Analysis:
                                                correlation==1.0.
             xaxis_title (str, optional): title for x axis.
             yaxis_title (str, optional): title for y axis.
+            nbins (int, optional): number of bins on each axis of density
+                                   tiles, used for more than self.max_points
+                                   rows. symbol is then ignored.
+            max_dimensions (int, optional): maximum number of columns to
+                                            plot. Columns with the largest
+                                            mean absolute correlation with
+                                            other columns are kept.
+            corr (RunningCorr, optional): statistics used for selecting
+                                          columns. If None, they are
+                                          calculated from df when needed.
             save_file (bool, optional): flag for saving an html file with plot.
         """
         logger.info('Creating scatter matrix.')
@@ -107,18 +390,44 @@ class Analysis:
         df = df.drop(columns_drop, 1)
         # create dimensions list after dropping columns
         dimensions = df.keys()
-        # plot matrix
-        fig = px.scatter_matrix(df,
-                                dimensions=dimensions,
-                                color=color,
-                                symbol=symbol)
-        # update layout
-        fig.update_layout(template=self.template,
-                          xaxis_title=xaxis_title,
-                          yaxis_title=yaxis_title)
-        # hide diagonal
-        if not diagonal_visible:
-            fig.update_traces(diagonal_visible=False)
+        # keep most correlated columns
+        if max_dimensions and len(dimensions) > max_dimensions:
+            if corr is None:
+                corr = cs.analysis.RunningCorr().update(df)
+            corr = corr.corr()
+            corr = corr.reindex(index=dimensions, columns=dimensions).abs()
+            # correlation of column with itself does not count
+            corr = corr.mask(np.eye(len(dimensions), dtype=bool))
+            strength = corr.mean()
+            dimensions = strength.nlargest(max_dimensions).index
+            logger.info('Selected {} most correlated columns for scatter '
+                        + 'matrix.', len(dimensions))
+        # too many points, aggregate into density tiles
+        if self.max_points and df.shape[0] > self.max_points:
+            logger.info('Aggregating {} rows into density tiles.',
+                        df.shape[0])
+            self.warn_ignored('scatter_matrix', symbol=symbol)
+            fig = self.density_matrix_figure(df,
+                                             dimensions=dimensions,
+                                             color=color,
+                                             nbins=nbins,
+                                             diagonal_visible=diagonal_visible)
+            # titles as in scatter matrix of points
+            fig.update_layout(xaxis_title=xaxis_title,
+                              yaxis_title=yaxis_title)
+        else:
+            # plot matrix
+            fig = px.scatter_matrix(df,
+                                    dimensions=dimensions,
+                                    color=color,
+                                    symbol=symbol)
+            # update layout
+            fig.update_layout(template=self.template,
+                              xaxis_title=xaxis_title,
+                              yaxis_title=yaxis_title)
+            # hide diagonal
+            if not diagonal_visible:
+                fig.update_traces(diagonal_visible=False)
         # save file
         if save_file:
             self.save_plotly(fig, 'scatter_matrix', self.folder)
@@ -126,6 +435,7 @@ class Analysis:
         else:
             fig.show()
 
+    @cached_figure
     def communication(self, df, pre_q, post_qs, save_file=False):
         """
         Barplot of all communication data in pre and post-questionaire
@@ -189,6 +499,7 @@ class Analysis:
         else:
             fig.show()
 
+    @cached_figure
     def bar(self, df, y: list, x=None, stacked=False, pretty_text=False,
             orientation='v', xaxis_title=None, yaxis_title=None,
             show_all_xticks=False, show_all_yticks=False,
@@ -219,13 +530,7 @@ class Analysis:
         logger.info('Creating bar chart for x={} and y={}', x, y)
         # prettify text
         if pretty_text:
-            for variable in y:
-                # check if column contains strings
-                if isinstance(df.iloc[0][variable], str):
-                    # replace underscores with spaces
-                    df[variable] = df[variable].str.replace('_', ' ')
-                    # capitlise
-                    df[variable] = df[variable].str.capitalize()
+            df = self.prettify(df, y)
         # use index of df if no is given
         if not x:
             x = df.index
@@ -294,11 +599,12 @@ class Analysis:
         else:
             fig.show()
 
+    @cached_figure
     def scatter(self, df, x, y, color=None, symbol=None, size=None, text=None,
                 trendline=None, hover_data=None, marker_size=None,
                 pretty_text=False, marginal_x='violin', marginal_y='violin',
                 xaxis_title=None, yaxis_title=None, xaxis_range=None,
-                yaxis_range=None, save_file=True):
+                yaxis_range=None, large_data='density', save_file=True):
         """
         Output scatter plot of variables x and y with optinal assignment of
         colour and size.
@@ -326,6 +632,15 @@ class Analysis:
             yaxis_title (str, optional): title for y axis.
             xaxis_range (list, optional): range of x axis in format [min, max].
             yaxis_range (list, optional): range of y axis in format [min, max].
+            large_data (str, optional): rendering for more than
+                                        self.max_points points. 'density'
+                                        for density tiles aggregated before
+                                        saving, so size of file does not
+                                        depend on number of points; symbol,
+                                        size, text, trendline, hover_data,
+                                        marker_size and marginals other than
+                                        histograms are then ignored. 'webgl'
+                                        for WebGL traces with all points.
             save_file (bool, optional): flag for saving an html file with plot.
         """
         logger.info('Creating scatter plot for x={} and y={}.', x, y)
@@ -342,58 +657,55 @@ class Analysis:
             return -1
         # prettify text
         if pretty_text:
-            if isinstance(df.iloc[0][x], str):  # check if string
-                # replace underscores with spaces
-                df[x] = df[x].str.replace('_', ' ')
-                # capitlise
-                df[x] = df[x].str.capitalize()
-            if isinstance(df.iloc[0][y], str):  # check if string
-                # replace underscores with spaces
-                df[y] = df[y].str.replace('_', ' ')
-                # capitlise
-                df[y] = df[y].str.capitalize()
-            if color and isinstance(df.iloc[0][color], str):  # check if string
-                # replace underscores with spaces
-                df[color] = df[color].str.replace('_', ' ')
-                # capitlise
-                df[color] = df[color].str.capitalize()
-            if size and isinstance(df.iloc[0][size], str):  # check if string
-                # replace underscores with spaces
-                df[size] = df[size].str.replace('_', ' ')
-                # capitlise
-                df[size] = df[size].str.capitalize()
-            try:
-                # check if string
-                if text and isinstance(df.iloc[0][text], str):
-                    # replace underscores with spaces
-                    df[text] = df[text].str.replace('_', ' ')
-                    # capitlise
-                    df[text] = df[text].str.capitalize()
-            except ValueError as e:
-                logger.debug('Tried to prettify {} with exception {}', text, e)
+            df = self.prettify(df, [x, y, color, size, text])
+        # number of points too large for svg rendering
+        large = self.max_points and df.shape[0] > self.max_points
+        # density tiles with histograms
+        if large and large_data == 'density':
+            logger.info('Aggregating {} points into density tiles.',
+                        df.shape[0])
+            self.warn_ignored('scatter',
+                              symbol=symbol,
+                              size=size,
+                              text=text,
+                              trendline=trendline,
+                              hover_data=hover_data,
+                              marker_size=marker_size,
+                              marginal_x=self.get_ignored_marginal(marginal_x),  # noqa: E501
+                              marginal_y=self.get_ignored_marginal(marginal_y))  # noqa: E501
+            fig = self.density_figure(df,
+                                      x=x,
+                                      y=y,
+                                      color=color,
+                                      xaxis_title=xaxis_title,
+                                      yaxis_title=yaxis_title,
+                                      xaxis_range=xaxis_range,
+                                      yaxis_range=yaxis_range)
         # scatter plot with histograms
-        with warnings.catch_warnings():
-            warnings.simplefilter('ignore', category=RuntimeWarning)
-            fig = px.scatter(df,
-                             x=x,
-                             y=y,
-                             color=color,
-                             symbol=symbol,
-                             size=size,
-                             text=text,
-                             trendline=trendline,
-                             hover_data=hover_data,
-                             marginal_x=marginal_x,
-                             marginal_y=marginal_y)
-        # update layout
-        fig.update_layout(template=self.template,
-                          xaxis_title=xaxis_title,
-                          yaxis_title=yaxis_title,
-                          xaxis_range=xaxis_range,
-                          yaxis_range=yaxis_range)
-        # change marker size
-        if marker_size:
-            fig.update_traces(marker=dict(size=marker_size))
+        else:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', category=RuntimeWarning)
+                fig = px.scatter(df,
+                                 x=x,
+                                 y=y,
+                                 color=color,
+                                 symbol=symbol,
+                                 size=size,
+                                 text=text,
+                                 trendline=trendline,
+                                 hover_data=hover_data,
+                                 marginal_x=marginal_x,
+                                 marginal_y=marginal_y,
+                                 render_mode='webgl' if large else 'auto')
+            # update layout
+            fig.update_layout(template=self.template,
+                              xaxis_title=xaxis_title,
+                              yaxis_title=yaxis_title,
+                              xaxis_range=xaxis_range,
+                              yaxis_range=yaxis_range)
+            # change marker size
+            if marker_size:
+                fig.update_traces(marker=dict(size=marker_size))
         # save file
         if save_file:
             self.save_plotly(fig,
@@ -403,6 +715,7 @@ class Analysis:
         else:
             fig.show()
 
+    @cached_figure
     def heatmap(self, df, x, y, pretty_text=False, marginal_x='violin',
                 marginal_y='violin', xaxis_title=None, yaxis_title=None,
                 save_file=True):
@@ -427,26 +740,30 @@ class Analysis:
                     x, y)
         # prettify text
         if pretty_text:
-            if isinstance(df.iloc[0][x], str):  # check if string
-                # replace underscores with spaces
-                df[x] = df[x].str.replace('_', ' ')
-                # capitlise
-                df[x] = df[x].str.capitalize()
-            if isinstance(df.iloc[0][y], str):  # check if string
-                # replace underscores with spaces
-                df[y] = df[y].str.replace('_', ' ')
-                # capitlise
-                df[y] = df[y].str.capitalize()
-        # density map with histograms
-        fig = px.density_heatmap(df,
-                                 x=x,
-                                 y=y,
-                                 marginal_x='violin',
-                                 marginal_y='violin')
-        # update layout
-        fig.update_layout(template=self.template,
-                          xaxis_title=xaxis_title,
-                          yaxis_title=yaxis_title)
+            df = self.prettify(df, [x, y])
+        # too many points to embed in file, aggregate into density tiles
+        if self.max_points and df.shape[0] > self.max_points:
+            logger.info('Aggregating {} points into density tiles.',
+                        df.shape[0])
+            self.warn_ignored('heatmap',
+                              marginal_x=self.get_ignored_marginal(marginal_x),  # noqa: E501
+                              marginal_y=self.get_ignored_marginal(marginal_y))  # noqa: E501
+            fig = self.density_figure(df,
+                                      x=x,
+                                      y=y,
+                                      xaxis_title=xaxis_title,
+                                      yaxis_title=yaxis_title)
+        else:
+            # density map with histograms
+            fig = px.density_heatmap(df,
+                                     x=x,
+                                     y=y,
+                                     marginal_x='violin',
+                                     marginal_y='violin')
+            # update layout
+            fig.update_layout(template=self.template,
+                              xaxis_title=xaxis_title,
+                              yaxis_title=yaxis_title)
         # save file
         if save_file:
             self.save_plotly(fig,
@@ -456,6 +773,7 @@ class Analysis:
         else:
             fig.show()
 
+    @cached_figure
     def hist(self, df, x, nbins=None, color=None, pretty_text=False,
              marginal='rug', xaxis_title=None, yaxis_title=None,
              save_file=True):
@@ -464,7 +782,7 @@ class Analysis:
 
         Args:
             df (dataframe): dataframe with data from heroku.
-            x (list): column names of dataframe to plot.
+            x (list): column names of dataframe to plot, as list or index.
             nbins (int, optional): number of bins in histogram.
             color (str, optional): dataframe column to assign color of circles.
             pretty_text (bool, optional): prettify ticks by replacing _ with
@@ -483,18 +801,7 @@ class Analysis:
             return -1
         # prettify text
         if pretty_text:
-            for variable in x:
-                # check if column contains strings
-                if isinstance(df.iloc[0][variable], str):
-                    # replace underscores with spaces
-                    df[variable] = df[variable].str.replace('_', ' ')
-                    # capitlise
-                    df[variable] = df[variable].str.capitalize()
-            if color and isinstance(df.iloc[0][color], str):  # check if string
-                # replace underscores with spaces
-                df[color] = df[color].str.replace('_', ' ')
-                # capitlise
-                df[color] = df[color].str.capitalize()
+            df = self.prettify(df, list(x) + [color])
         # create figure
         if color:
             fig = px.histogram(df[x], nbins=nbins, marginal=marginal,
@@ -516,8 +823,9 @@ class Analysis:
         else:
             fig.show()
 
+    @cached_figure
     def hist_stim_duration_time(self, df, time_ranges, nbins=0,
-                                save_file=True):
+                                columns_index=None, save_file=True):
         """
         Output distribution of stimulus durations for time ranges.
 
@@ -525,32 +833,51 @@ class Analysis:
             df (dataframe): dataframe with data from heroku.
             time_ranges (dictionaries): time ranges for analysis.
             nbins (int, optional): number of bins in histogram.
+            columns_index (dict, optional): index of columns of heroku data
+                                            (Heroku.columns_index), used to
+                                            find columns with durations. If
+                                            None, columns of df are parsed.
             save_file (bool, optional): flag for saving an html file with plot.
         """
         logger.info('Creating histogram of stimulus durations for time ' +
                     'ranges.')
-        # columns with durations
-        col_dur = df.columns[df.columns.to_series().str.contains('-dur')]
-        # extract durations of stimuli
-        df_dur = df[col_dur]
-        df = df_dur.join(df['start'])
-        df['range'] = np.nan
-        # add column with labels based on time ranges
-        for i, t in enumerate(time_ranges):
-            for index, row in df.iterrows():
-                if t['start'] <= row['start'] <= t['end']:
-                    start_str = t['start'].strftime('%m.%d.%Y, %H:%M:%S')
-                    end_str = t['end'].strftime('%m.%d.%Y, %H:%M:%S')
-                    df.loc[index, 'range'] = start_str + ' - ' + end_str
-        # drop nan
-        df = df.dropna()
+        # columns with durations, named after keys of index of columns
+        if columns_index is None:
+            columns_index = cs.analysis.Heroku.parse_columns(df.columns)
+        names = {pos: '-'.join(str(part) for part in key)
+                 for key, pos in columns_index.items()}
+        col_dur = [names[pos]
+                   for pos in cs.analysis.Heroku.filter_positions(columns_index,  # noqa: E501
+                                                                  field='dur')]
+        # participants with all durations recorded, sorted by start time
+        df = df[list(col_dur) + ['start']].dropna().sort_values('start')
+        starts = df['start']
+        # positions of participants in each range. ranges are closed on both
+        # sides and can overlap, then participants are counted in each range
+        positions = []
+        labels = []
+        for t in time_ranges:
+            first = starts.searchsorted(pd.Timestamp(t['start']), side='left')
+            last = starts.searchsorted(pd.Timestamp(t['end']), side='right')
+            positions.append(np.arange(first, last))
+            start_str = t['start'].strftime('%m.%d.%Y, %H:%M:%S')
+            end_str = t['end'].strftime('%m.%d.%Y, %H:%M:%S')
+            labels.append(np.full(last - first, start_str + ' - ' + end_str,
+                                  dtype=object))
+        positions = np.concatenate(positions)
+        labels = np.concatenate(labels)
+        # melt durations into long format, column by column
+        durations = df[col_dur].values[positions].astype(float)
+        df_long = pd.DataFrame({'value': durations.ravel(order='F'),
+                                'range': np.tile(labels, len(col_dur))})
         # create figure
         if nbins:
-            fig = px.histogram(df[col_dur], nbins=nbins, marginal='rug',
-                               color=df['range'], barmode='overlay')
-        else:
-            fig = px.histogram(df[col_dur], marginal='rug', color=df['range'],
+            fig = px.histogram(df_long, x='value', nbins=nbins,
+                               marginal='rug', color='range',
                                barmode='overlay')
+        else:
+            fig = px.histogram(df_long, x='value', marginal='rug',
+                               color='range', barmode='overlay')
         # ticks as numbers
         fig.update_layout(xaxis=dict(tickformat='digits'))
         # update layout
@@ -568,7 +895,9 @@ class Analysis:
         else:
             fig.show()
 
-    def plot_kp(self, df, conf_interval=None, xaxis_title='Time (s)',
+    @cached_figure
+    def plot_kp(self, df, conf_interval=None, conf_method='t',
+                xaxis_title='Time (s)',
                 yaxis_title='Percentage of trials with response key pressed',
                 xaxis_range=None, yaxis_range=None, save_file=True):
         """Plot keypress data.
@@ -577,6 +906,9 @@ class Analysis:
             df (dataframe): dataframe with keypress data.
             conf_interval (float, optional): show confidence interval defined
                                              by argument.
+            conf_method (str, optional): method for confidence interval. 't'
+                                         for t-interval, 'bootstrap' for
+                                         bootstrap interval.
             xaxis_title (str, optional): title for x axis.
             yaxis_title (str, optional): title for y axis.
             xaxis_range (list, optional): range of x axis in format [min, max].
@@ -588,14 +920,9 @@ class Analysis:
         times = np.array(range(self.res,
                                df['video_length'].max() + self.res,
                                self.res)) / 1000
-        # add all data together. Must be converted to np array to add together
-        kp_data = np.array([0.0] * len(times))
-        for i, data in enumerate(df['kp']):
-            # append zeros to match longest duration
-            data = np.pad(data, (0, len(times) - len(data)), 'constant')
-            # add data
-            kp_data += np.array(data)
-        kp_data = (kp_data / i)
+        # mean keypresses over all stimuli, zeros after end of shorter stimuli
+        kp, _ = self.get_kp_matrix(df, length=len(times))
+        kp_data = kp.mean(axis=0)
         # create figure
         fig = go.Figure()
         # plot keypresses
@@ -605,8 +932,8 @@ class Analysis:
         # show confidence interval
         if conf_interval:
             # calculate condidence interval
-            (y_lower, y_upper) = self.get_conf_interval_bounds(kp_data,
-                                                               conf_interval)
+            (y_lower, y_upper) = self.get_kp_conf_interval_bounds(
+                df, len(times), conf_interval, conf_method)
             # plot interval
             fig.add_trace(go.Scatter(name='Upper Bound',
                                      x=times,
@@ -626,22 +953,27 @@ class Analysis:
                                      showlegend=False))
         # define range of y axis
         if not yaxis_range:
-            yaxis_range = [0, max(y_upper) if conf_interval else max(kp_data)]
+            yaxis_range = [0, np.nanmax(y_upper) if conf_interval
+                           else max(kp_data)]
         # update layout
         fig.update_layout(template=self.template,
                           xaxis_title=xaxis_title,
                           yaxis_title=yaxis_title,
                           xaxis_range=xaxis_range,
                           yaxis_range=yaxis_range)
+        # reduce number of points in traces
+        data = self.decimate_kp_figure(fig)
         # save file
         if save_file:
-            self.save_plotly(fig, 'kp', self.folder)
+            self.save_plotly(fig, 'kp', self.folder, data=data)
         # open it in localhost instead
         else:
             fig.show()
 
+    @cached_figure
     def plot_kp_video(self, df, stimulus, extention='mp4', conf_interval=None,
-                      show_lines=False, xaxis_title='Time (s)',
+                      conf_method='t', show_lines=False,
+                      xaxis_title='Time (s)',
                       yaxis_title='Percentage of trials with ' +
                                   'response key pressed',
                       xaxis_range=None, yaxis_range=None, save_file=True):
@@ -653,6 +985,9 @@ class Analysis:
             extention (str, optional): extension of stimulus.
             conf_interval (float, optional): show confidence interval defined
                                              by argument.
+            conf_method (str, optional): method for confidence interval. 't'
+                                         for t-interval, 'bootstrap' for
+                                         bootstrap interval.
             show_lines (bool, optional): show dotted lines for start and end of
                                       eye contact, deceleration, full stop,
                                       takeoff
@@ -668,6 +1003,8 @@ class Analysis:
         times = np.array(range(self.res, video_len + self.res, self.res)) / 1000  # noqa: E501
         # keypress data
         kp_data = df.loc[stimulus]['kp']
+        # data for confidence interval
+        df_conf = df.loc[[stimulus]]
         # plot keypresses
         fig = px.line(y=df.loc[stimulus]['kp'],
                       x=times,
@@ -708,8 +1045,8 @@ class Analysis:
         # show confidence interval
         if conf_interval:
             # calculate condidence interval
-            (y_lower, y_upper) = self.get_conf_interval_bounds(kp_data,
-                                                               conf_interval)
+            (y_lower, y_upper) = self.get_kp_conf_interval_bounds(
+                df_conf, len(times), conf_interval, conf_method)
             # plot interval
             fig.add_trace(go.Scatter(name='Upper Bound',
                                      x=times,
@@ -729,20 +1066,24 @@ class Analysis:
                                      showlegend=False))
         # define range of y axis
         if not yaxis_range:
-            yaxis_range = [0, max(y_upper) if conf_interval else max(kp_data)]
+            yaxis_range = [0, np.nanmax(y_upper) if conf_interval
+                           else max(kp_data)]
         # update layout
         fig.update_layout(template=self.template,
                           xaxis_title=xaxis_title,
                           yaxis_title=yaxis_title,
                           xaxis_range=xaxis_range,
                           yaxis_range=yaxis_range)
+        # reduce number of points in traces
+        data = self.decimate_kp_figure(fig)
         # save file
         if save_file:
-            self.save_plotly(fig, 'kp_' + stimulus, self.folder)
+            self.save_plotly(fig, 'kp_' + stimulus, self.folder, data=data)
         # open it in localhost instead
         else:
             fig.show()
 
+    @cached_figure
     def plot_kp_videos(self, df, xaxis_title='Time (s)',
                        yaxis_title='Percentage of trials with ' +
                                    'response key pressed',
@@ -800,13 +1141,16 @@ class Analysis:
                           yaxis_title=yaxis_title,
                           xaxis_range=xaxis_range,
                           yaxis_range=yaxis_range)
+        # reduce number of points in traces
+        data = self.decimate_kp_figure(fig)
         # save file
         if save_file:
-            self.save_plotly(fig, 'kp_videos', self.folder)
+            self.save_plotly(fig, 'kp_videos', self.folder, data=data)
         # open it in localhost instead
         else:
             fig.show()
 
+    @cached_figure
     def plot_kp_variable(self, df, variable, values=None,
                          xaxis_title='Time (s)',
                          yaxis_title='Percentage of trials with ' +
@@ -832,26 +1176,15 @@ class Analysis:
         # if no values specified, plot value
         if not values:
             values = df[variable].unique()
+        # mean keypresses for each value of variable. nan is kept as a value
+        kp, _ = self.get_kp_matrix(df, length=len(times))
+        kp_means = pd.DataFrame(kp, index=df[variable].values)
+        kp_means = kp_means.groupby(level=0, dropna=False).mean()
+        # values without data are shown as zeros
+        kp_means = kp_means.reindex(values).fillna(0)
         # extract data for values
         extracted_data = []
-        for value in values:
-            kp_data = np.array([0.0] * len(times))
-            # non-nan value (provide as np.nan)
-            if not pd.isnull(value):
-                df_f = df[df[variable] == value]
-            # nan value
-            else:
-                df_f = df[df[variable].isnull()]
-            # go over extracted videos
-            for index, row in df_f.iterrows():
-                data_row = np.array(row['kp'])
-                # append zeros to match longest duration
-                data_row = np.pad(data_row, (0, len(times) - len(data_row)),
-                                  'constant')
-                kp_data = kp_data + data_row
-            # divide sums of values over number of rows that qualify
-            if df_f.shape[0]:
-                kp_data = kp_data / df_f.shape[0]
+        for value, kp_data in zip(values, kp_means.values):
             extracted_data.append({'value': value,
                                    'data': kp_data})
         # plotly figure
@@ -894,16 +1227,20 @@ class Analysis:
                           yaxis_title=yaxis_title,
                           xaxis_range=xaxis_range,
                           yaxis_range=yaxis_range)
+        # reduce number of points in traces
+        data = self.decimate_kp_figure(fig)
         # save file
         if save_file:
             self.save_plotly(fig,
                              'kp_' + variable + '-' +
                              '-'.join(str(val) for val in values),
-                             self.folder)
+                             self.folder,
+                             data=data)
         # open it in localhost instead
         else:
             fig.show()
 
+    @cached_figure
     def plot_kp_variables_or(self, df, variables, xaxis_title='Time (s)',
                              yaxis_title='Percentage of trials with ' +
                                          'response key pressed',
@@ -929,21 +1266,17 @@ class Analysis:
                 '-' + str(variable['value'])
         # calculate times
         times = np.array(range(self.res, df['video_length'].max() + self.res, self.res)) / 1000  # noqa: E501
+        # keypress data of all stimuli
+        kp, _ = self.get_kp_matrix(df, length=len(times))
         # extract data for values
         extracted_data = []
         for var in variables:
-            kp_data = np.array([0.0] * len(times))
-            # non-nan value (provide as np.nan)
-            if not pd.isnull(var['value']):
-                df_f = df[df[var['variable']] == var['value']]
-            # nan value
+            rows = self.get_filter_mask(df, var['variable'], var['value'])
+            # mean of rows that qualify
+            if rows.any():
+                kp_data = kp[rows].mean(axis=0)
             else:
-                df_f = df[var['variable'].isnull()]
-            for index, row in df_f.iterrows():  # noqa: E501
-                kp_data = kp_data + np.array(row['kp'])
-            # divide sums of values over number of rows that qualify
-            if df_f.shape[0]:
-                kp_data = kp_data / df_f.shape[0]
+                kp_data = np.zeros(len(times))
             extracted_data.append({'value': str(var['variable']) + '-' + str(var['value']),  # noqa: E501
                                    'data': kp_data})
         # plotly figure
@@ -986,15 +1319,21 @@ class Analysis:
                           yaxis_title=yaxis_title,
                           xaxis_range=xaxis_range,
                           yaxis_range=yaxis_range)
+        # reduce number of points in traces
+        data = self.decimate_kp_figure(fig)
         # save file
         if save_file:
-            self.save_plotly(fig, 'kp_or' + variables_str, self.folder)
+            self.save_plotly(fig,
+                             'kp_or' + variables_str,
+                             self.folder,
+                             data=data)
         # open it in localhost instead
         else:
             fig.show()
 
+    @cached_figure
     def plot_kp_variables_and(self, df, variables, conf_interval=None,
-                              xaxis_title='Time (s)',
+                              conf_method='t', xaxis_title='Time (s)',
                               yaxis_title='Percentage of trials with ' +
                                           'response key pressed',
                               xaxis_range=None, yaxis_range=None,
@@ -1006,6 +1345,9 @@ class Analysis:
             variables (list): variables to plot.
             conf_interval (float, optional): show confidence interval defined
                                              by argument.
+            conf_method (str, optional): method for confidence interval. 't'
+                                         for t-interval, 'bootstrap' for
+                                         bootstrap interval.
             xaxis_title (str, optional): title for x axis.
             yaxis_title (str, optional): title for y axis.
             xaxis_range (list, optional): range of x axis in format [min, max].
@@ -1020,25 +1362,19 @@ class Analysis:
             variables_str = variables_str + '_' + str(variable['variable'])
         # calculate times
         times = np.array(range(self.res, df['video_length'].max() + self.res, self.res)) / 1000  # noqa: E501
-        # filter df based on variables given
+        # filter df based on all variables given
+        rows = np.ones(df.shape[0], dtype=bool)
         for var in variables:
-            # non-nan value (provide as np.nan)
-            if not pd.isnull(var['value']):
-                df_f = df[df[var['variable']] == var['value']]
-            # nan value
-            else:
-                df_f = df[df[var['variable']].isnull()]
+            rows &= self.get_filter_mask(df, var['variable'], var['value'])
         # check if any data in df left
-        if df_f.empty:
+        if not rows.any():
             logger.error('Provided variables yielded empty dataframe.')
             return
-        # add all data together. Must be converted to np array
-        kp_data = np.array([0.0] * len(times))
-        for i, data in enumerate(df_f['kp']):
-            kp_data += np.array(data)
-        # divide sums of values over number of rows that qualify
-        if df_f.shape[0]:
-            kp_data = kp_data / df_f.shape[0]
+        # mean of rows that qualify
+        kp, _ = self.get_kp_matrix(df, length=len(times))
+        kp_data = kp[rows].mean(axis=0)
+        # data for confidence interval
+        df_conf = df[rows]
         # plot keypresses
         fig = px.line(y=kp_data,
                       x=times,
@@ -1046,8 +1382,8 @@ class Analysis:
         # show confidence interval
         if conf_interval:
             # calculate condidence interval
-            (y_lower, y_upper) = self.get_conf_interval_bounds(kp_data,
-                                                               conf_interval)
+            (y_lower, y_upper) = self.get_kp_conf_interval_bounds(
+                df_conf, len(times), conf_interval, conf_method)
             # plot interval
             fig.add_trace(go.Scatter(name='Upper Bound',
                                      x=times,
@@ -1067,20 +1403,27 @@ class Analysis:
                                      showlegend=False))
         # define range of y axis
         if not yaxis_range:
-            yaxis_range = [0, max(y_upper) if conf_interval else max(kp_data)]
+            yaxis_range = [0, np.nanmax(y_upper) if conf_interval
+                           else max(kp_data)]
         # update layout
         fig.update_layout(template=self.template,
                           xaxis_title=xaxis_title,
                           yaxis_title=yaxis_title,
                           xaxis_range=xaxis_range,
                           yaxis_range=yaxis_range)
+        # reduce number of points in traces
+        data = self.decimate_kp_figure(fig)
         # save file
         if save_file:
-            self.save_plotly(fig, 'kp_and' + variables_str, self.folder)
+            self.save_plotly(fig,
+                             'kp_and' + variables_str,
+                             self.folder,
+                             data=data)
         # open it in localhost instead
         else:
             fig.show()
 
+    @cached_figure
     def map(self, df, color, save_file=True):
         """Map of countries of participation with color based on column in
            dataframe.
@@ -1106,14 +1449,328 @@ class Analysis:
         else:
             fig.show()
 
-    def save_plotly(self, fig, name, output_subdir):
+    def get_bins(self, values, nbins):
+        """
+        Assign values to bins. Numeric values are split into bins of equal
+        width, other values get a bin for each category.
+
+        Args:
+            values (series): values to assign.
+            nbins (int): number of bins for numeric values.
+
+        Returns:
+            ndarray, ndarray: index of bin of each value (-1 for missing
+                              values) and centers of bins or categories.
+        """
+        values = pd.Series(values)
+        if (pd.api.types.is_numeric_dtype(values)
+                and not pd.api.types.is_bool_dtype(values)):
+            values = values.to_numpy(dtype=float)
+            finite = np.isfinite(values)
+            idx = np.full(len(values), -1)
+            if not finite.any():
+                return idx, np.empty(0)
+            edges = np.histogram_bin_edges(values[finite], bins=nbins)
+            idx[finite] = np.clip(np.searchsorted(edges,
+                                                  values[finite],
+                                                  side='right') - 1,
+                                  0,
+                                  len(edges) - 2)
+            return idx, (edges[:-1] + edges[1:]) / 2
+        codes, categories = pd.factorize(values, sort=True)
+        return codes, np.asarray(categories, dtype=object)
+
+    def get_density_tiles(self, x, y, color=None, nbins=None):
         """
-        Helper function to save figure as html file.
+        Aggregate points into 2-D tiles with statistics for hover labels.
+
+        Args:
+            x (series): values on x axis.
+            y (series): values on y axis.
+            color (series, optional): values summarised in each tile: mean for
+                                      numeric values, most common value and
+                                      its share otherwise.
+            nbins (int, optional): number of bins on each axis. Defaults to
+                                   self.density_bins.
+
+        Returns:
+            dict: centers of bins on axes (x, y), counts of points in tiles
+                  with nan for empty tiles (z), statistics of tiles
+                  (customdata) and template for hover labels (hover).
+        """
+        if nbins is None:
+            nbins = self.density_bins
+        ix, x_bins = self.get_bins(x, nbins)
+        iy, y_bins = self.get_bins(y, nbins)
+        valid = (ix >= 0) & (iy >= 0)
+        shape = (len(y_bins), len(x_bins))
+        # flat index of tile of each point
+        tile = iy[valid] * len(x_bins) + ix[valid]
+        counts = np.bincount(tile, minlength=shape[0] * shape[1])
+        customdata = [counts]
+        hover = 'x: %{x}<br>y: %{y}<br>count: %{customdata[0]}'
+        if color is not None:
+            color = pd.Series(color).iloc[np.flatnonzero(valid)]
+            name = color.name if color.name is not None else 'color'
+            if (pd.api.types.is_numeric_dtype(color)
+                    and not pd.api.types.is_bool_dtype(color)):
+                values = color.to_numpy(dtype=float)
+                present = ~np.isnan(values)
+                sums = np.bincount(tile[present],
+                                   weights=values[present],
+                                   minlength=len(counts))
+                n = np.bincount(tile[present], minlength=len(counts))
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    customdata.append(np.round(sums / n, 3))
+                hover += '<br>mean ' + str(name) + ': %{customdata[1]}'
+            else:
+                # counts of values in each tile
+                table = pd.crosstab(tile, color.to_numpy())
+                top = np.full(len(counts), '', dtype=object)
+                share = np.full(len(counts), np.nan)
+                top[table.index] = table.idxmax(axis=1).to_numpy()
+                share[table.index] = np.round(
+                    table.max(axis=1) / table.sum(axis=1), 3)
+                customdata.extend([top, share])
+                hover += ('<br>most common ' + str(name)
+                          + ': %{customdata[1]} (%{customdata[2]})')
+        z = counts.reshape(shape).astype(float)
+        z[z == 0] = np.nan
+        customdata = np.stack([np.asarray(c, dtype=object).reshape(shape)
+                               for c in customdata], axis=-1)
+        return {'x': x_bins,
+                'y': y_bins,
+                'z': z,
+                'customdata': customdata,
+                'hover': hover + '<extra></extra>'}
+
+    def warn_ignored(self, figure, **kwargs):
+        """
+        Log a warning for each argument of figure that is ignored by density
+        tiles.
+
+        Args:
+            figure (str): name of figure.
+            **kwargs: arguments, None if not given.
+        """
+        for name, value in kwargs.items():
+            if value is not None:
+                logger.warning('Argument {}={} of {} is ignored with density '
+                               + 'tiles.',
+                               name,
+                               value,
+                               figure)
+
+    def get_ignored_marginal(self, marginal):
+        """
+        Marginal ignored by density tiles, which show histograms as marginals.
+
+        Args:
+            marginal (str): type of marginal.
+
+        Returns:
+            str: marginal, None if it is a histogram or not given.
+        """
+        return None if marginal in (None, 'histogram') else marginal
+
+    def density_figure(self, df, x, y, color=None, nbins=None,
+                       xaxis_title=None, yaxis_title=None, xaxis_range=None,
+                       yaxis_range=None):
+        """
+        Figure with density tiles of variables x and y and histograms of both
+        variables. Only aggregated values are stored in the figure, so its
+        size does not depend on number of points.
+
+        Args:
+            df (dataframe): dataframe with data.
+            x (str): dataframe column to plot on x axis.
+            y (str): dataframe column to plot on y axis.
+            color (str, optional): dataframe column summarised in hover
+                                   labels of tiles.
+            nbins (int, optional): number of bins on each axis.
+            xaxis_title (str, optional): title for x axis.
+            yaxis_title (str, optional): title for y axis.
+            xaxis_range (list, optional): range of x axis in format [min, max].
+            yaxis_range (list, optional): range of y axis in format [min, max].
+
+        Returns:
+            plotly figure: figure object.
+        """
+        tiles = self.get_density_tiles(df[x],
+                                       df[y],
+                                       df[color] if color else None,
+                                       nbins)
+        counts = np.nan_to_num(tiles['z'])
+        fig = subplots.make_subplots(rows=2,
+                                     cols=2,
+                                     column_widths=[0.8, 0.2],
+                                     row_heights=[0.2, 0.8],
+                                     shared_xaxes=True,
+                                     shared_yaxes=True,
+                                     horizontal_spacing=0.02,
+                                     vertical_spacing=0.02)
+        # tiles
+        fig.add_trace(go.Heatmap(x=tiles['x'],
+                                 y=tiles['y'],
+                                 z=tiles['z'],
+                                 customdata=tiles['customdata'],
+                                 hovertemplate=tiles['hover'],
+                                 colorbar=dict(title='count')),
+                      row=2,
+                      col=1)
+        # histograms of x and y
+        fig.add_trace(go.Bar(x=tiles['x'],
+                             y=counts.sum(axis=0),
+                             name=x,
+                             showlegend=False),
+                      row=1,
+                      col=1)
+        fig.add_trace(go.Bar(x=counts.sum(axis=1),
+                             y=tiles['y'],
+                             name=y,
+                             orientation='h',
+                             showlegend=False),
+                      row=2,
+                      col=2)
+        # update layout
+        fig.update_layout(template=self.template, bargap=0)
+        fig.update_xaxes(title_text=xaxis_title or x,
+                         range=xaxis_range,
+                         row=2,
+                         col=1)
+        fig.update_yaxes(title_text=yaxis_title or y,
+                         range=yaxis_range,
+                         row=2,
+                         col=1)
+        return fig
+
+    def density_matrix_figure(self, df, dimensions, color=None, nbins=30,
+                              diagonal_visible=False):
+        """
+        Scatter matrix with density tiles in place of points.
+
+        Args:
+            df (dataframe): dataframe with data.
+            dimensions (list): dataframe columns to plot.
+            color (str, optional): dataframe column summarised in hover
+                                   labels of tiles.
+            nbins (int, optional): number of bins on each axis.
+            diagonal_visible (bool, optional): show histograms on diagonal.
+
+        Returns:
+            plotly figure: figure object.
+        """
+        dimensions = list(dimensions)
+        num = len(dimensions)
+        fig = subplots.make_subplots(rows=num,
+                                     cols=num,
+                                     horizontal_spacing=0.01,
+                                     vertical_spacing=0.01)
+        for i, dim_y in enumerate(dimensions):
+            for j, dim_x in enumerate(dimensions):
+                # histogram of variable on diagonal
+                if i == j:
+                    if diagonal_visible:
+                        idx, bins = self.get_bins(df[dim_x], nbins)
+                        counts = np.bincount(idx[idx >= 0],
+                                             minlength=len(bins))
+                        fig.add_trace(go.Bar(x=bins,
+                                             y=counts,
+                                             name=dim_x,
+                                             showlegend=False),
+                                      row=i + 1,
+                                      col=j + 1)
+                    continue
+                tiles = self.get_density_tiles(df[dim_x],
+                                               df[dim_y],
+                                               df[color] if color else None,
+                                               nbins)
+                fig.add_trace(go.Heatmap(x=tiles['x'],
+                                         y=tiles['y'],
+                                         z=tiles['z'],
+                                         customdata=tiles['customdata'],
+                                         hovertemplate=tiles['hover'],
+                                         coloraxis='coloraxis'),
+                              row=i + 1,
+                              col=j + 1)
+        # axis titles on outer subplots
+        for k, dim in enumerate(dimensions):
+            fig.update_xaxes(title_text=dim, row=num, col=k + 1)
+            fig.update_yaxes(title_text=dim, row=k + 1, col=1)
+        fig.update_layout(template=self.template,
+                          bargap=0,
+                          coloraxis=dict(colorbar=dict(title='count')))
+        return fig
+
+    def decimate_kp_figure(self, fig):
+        """
+        Reduce number of points in line traces of keypress figure to
+        self.kp_max_points. Lines are decimated with self.kp_decimation and
+        bounds of confidence intervals with a min/max envelope, so that both
+        sides of the band keep the same x values.
+
+        Args:
+            fig (plotly figure): figure object, modified in place.
+
+        Returns:
+            dataframe: full-resolution data of all traces with x values as
+                       index, or None if no trace was decimated.
+        """
+        if not self.kp_max_points:
+            return None
+        traces = [t for t in fig.data
+                  if t.type == 'scatter' and t.y is not None
+                  and len(t.y) > self.kp_max_points]
+        if not traces:
+            return None
+        # keep full-resolution data before changing traces. columns are named
+        # after traces, with trace index added to empty and duplicate names
+        names = [t.name for t in fig.data]
+        columns = {}
+        for i, t in enumerate(fig.data):
+            if t.type != 'scatter' or t.y is None:
+                continue
+            column = t.name
+            if not column or names.count(column) > 1:
+                column = '{} {}'.format(column or 'trace', i)
+            columns[column] = pd.Series(np.asarray(t.y),
+                                        index=np.asarray(t.x))
+        data = pd.DataFrame(columns)
+        data.index.name = 'time'
+        for trace in traces:
+            if trace.name == 'Upper Bound':
+                x, y = cs.analysis.decimate.envelope(trace.x,
+                                                     trace.y,
+                                                     self.kp_max_points,
+                                                     'upper')
+            elif trace.name == 'Lower Bound':
+                x, y = cs.analysis.decimate.envelope(trace.x,
+                                                     trace.y,
+                                                     self.kp_max_points,
+                                                     'lower')
+            else:
+                x, y = cs.analysis.decimate.decimate(trace.x,
+                                                     trace.y,
+                                                     self.kp_max_points,
+                                                     self.kp_decimation)
+            trace.update(x=x, y=y)
+        logger.debug('Decimated {} traces to {} points.',
+                     len(traces),
+                     self.kp_max_points)
+        return data
+
+    def save_plotly(self, fig, name, output_subdir, data=None):
+        """
+        Helper function to save figure as html file or gzipped json file,
+        depending on self.output_mode.
 
         Args:
             fig (plotly figure): figure object.
             name (str): name of html file.
             output_subdir (str): Folder for saving file.
+            data (dataframe, optional): full-resolution data of figure, saved
+                                        to csv file next to figure and linked
+                                        from it.
         """
         # build path
         path = cs.settings.output_dir + output_subdir
@@ -1124,9 +1781,201 @@ class Analysis:
         # limit name to 255 char
         if len(path) + len(name) > 250:
             name = name[:255 - len(path) - 5]
-        file_plot = os.path.join(path + name + '.html')
-        # save to file
-        py.offline.plot(fig, filename=file_plot)
+        # full-resolution data as linked download
+        if data is not None:
+            file_data = os.path.join(path + name + '.csv')
+            data.to_csv(file_data)
+            self.saved_files.append(file_data)
+            fig.add_annotation(text='<a href="{}">Full-resolution data</a>'
+                               .format(name + '.csv'),
+                               xref='paper',
+                               yref='paper',
+                               x=1,
+                               y=-0.12,
+                               xanchor='right',
+                               showarrow=False)
+        # self-contained html file with plotly.js inlined
+        if self.output_mode == 'html':
+            file_plot = os.path.join(path + name + '.html')
+            py.offline.plot(fig, filename=file_plot)
+        # html file referencing plotly.min.js stored in the same folder.
+        # plotly writes the bundle only if it is not in the folder yet
+        elif self.output_mode == 'shared':
+            file_plot = os.path.join(path + name + '.html')
+            py.offline.plot(fig,
+                            filename=file_plot,
+                            include_plotlyjs='directory')
+        # only figure data as compressed json
+        else:
+            self.save_plotlyjs(path)
+            file_plot = os.path.join(path + name + '.json.gz')
+            with gzip.open(file_plot, 'wt', encoding='utf-8') as f:
+                f.write(fig.to_json())
+        self.saved_files.append(file_plot)
+        logger.debug('Saved figure to {}.', file_plot)
+        # keep figure for static export
+        if self.static_formats:
+            self.export_queue.append(('plotly', fig.to_json(), name, 0))
+
+    def set_backend(self, headless=None):
+        """
+        Select backend of matplotlib. Headless mode uses the non-interactive
+        Agg backend, otherwise TkAgg is used for showing figures.
+
+        Args:
+            headless (bool, optional): use headless mode. If None, headless
+                                       mode is used when no display is
+                                       available.
+        """
+        if headless is None:
+            headless = (sys.platform.startswith('linux')
+                        and not os.environ.get('DISPLAY')
+                        and not os.environ.get('WAYLAND_DISPLAY'))
+        backend = 'Agg' if headless else 'TkAgg'
+        # switching backend closes open figures, so only do it if needed
+        if matplotlib.get_backend().lower() == backend.lower():
+            return
+        try:
+            plt.switch_backend(backend)
+        except ImportError as e:
+            logger.warning('Backend {} not available ({}), using Agg.',
+                           backend,
+                           e)
+            plt.switch_backend('Agg')
+        logger.debug('Using matplotlib backend {}.', matplotlib.get_backend())
+
+    @cs.instrument.stage('analysis.export_static')
+    def export_static(self, formats=None, n_jobs=None):
+        """
+        Write figures saved since creation of the object (or the last export)
+        to static files in parallel worker processes, and save a report with
+        time of export of each file. Plotly figures need the optional package
+        kaleido (0.2.1 with plotly 4); they are skipped if it is not
+        installed. Figures skipped by the figure cache are not exported again.
+
+        Args:
+            formats (list, optional): formats of files, e.g. ['png', 'svg',
+                                      'pdf']. Defaults to self.static_formats.
+            n_jobs (int, optional): number of worker processes. Defaults to
+                                    self.n_jobs.
+
+        Returns:
+            dataframe: report with file, kind of figure, format, time of
+                       export in seconds and error for each file.
+        """
+        if formats is None:
+            formats = self.static_formats
+        if n_jobs is None:
+            n_jobs = self.n_jobs
+        queue = self.export_queue
+        self.export_queue = []
+        if not formats or not queue:
+            logger.info('No figures for static export.')
+            return None
+        # plotly needs kaleido for static images
+        if importlib.util.find_spec('kaleido') is None:
+            skipped = [q for q in queue if q[0] == 'plotly']
+            if skipped:
+                logger.warning('Package kaleido is not installed, skipping '
+                               + 'static export of {} plotly figures. '
+                               + 'Install it with pip install '
+                               + 'kaleido==0.2.1.',
+                               len(skipped))
+            queue = [q for q in queue if q[0] != 'plotly']
+        # build path
+        path = cs.settings.output_dir + self.folder_static
+        if not os.path.exists(path):
+            os.makedirs(path)
+        logger.info('Exporting {} figures to {} with {} workers.',
+                    len(queue),
+                    formats,
+                    n_jobs)
+        start = time.perf_counter()
+        args = [(kind, payload, path + name, formats, pad_inches)
+                for kind, payload, name, pad_inches in queue]
+        if n_jobs > 1 and len(args) > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs,
+                                     **cs.logmod.worker_init()) as pool:
+                reports = list(pool.map(export_figure, *zip(*args)))
+        else:
+            reports = [export_figure(*a) for a in args]
+        report = pd.DataFrame([r for rep in reports for r in rep],
+                              columns=['file', 'kind', 'format', 'time',
+                                       'error'])
+        for _, row in report[report['error'].notna()].iterrows():
+            logger.error('Static export of {} failed: {}.',
+                         row['file'],
+                         row['error'])
+        # save report
+        file_report = os.path.join(path, 'export_times.csv')
+        report.to_csv(file_report, index=False)
+        logger.info('Exported {} files in {:.2f} s (sum of per-figure times '
+                    + '{:.2f} s). Report saved to {}.',
+                    (report['error'].isna()).sum(),
+                    time.perf_counter() - start,
+                    report['time'].sum(),
+                    file_report)
+        return report
+
+    def save_plotlyjs(self, path):
+        """
+        Write a local copy of plotly.min.js to the given folder, unless it is
+        there already.
+
+        Args:
+            path (str): folder for saving file.
+        """
+        file_js = os.path.join(path, 'plotly.min.js')
+        if not os.path.exists(file_js):
+            with open(file_js, 'w', encoding='utf-8') as f:
+                f.write(py.offline.get_plotlyjs())
+            logger.info('Saved plotly.js bundle to {}.', file_js)
+
+    def save_index(self, output_subdir=None):
+        """
+        Generate index.html page listing figures in the output folder. The
+        figures are loaded on demand: html files in an iframe and gzipped json
+        files with the local copy of plotly.js. Browsers do not allow loading
+        json files from file:// pages, so the folder with json figures needs
+        to be served over http (e.g., with python -m http.server).
+
+        Args:
+            output_subdir (str, optional): folder with figures. Defaults to
+                                           self.folder.
+        """
+        if output_subdir is None:
+            output_subdir = self.folder
+        path = cs.settings.output_dir + output_subdir
+        if not os.path.exists(path):
+            logger.error('Folder {} with figures does not exist.', path)
+            return
+        # collect figures saved in all modes
+        figures = []
+        for file in sorted(os.listdir(path)):
+            if file.endswith('.html') and file != 'index.html':
+                figures.append({'name': file[:-len('.html')],
+                                'file': file,
+                                'type': 'html'})
+            elif file.endswith('.json.gz'):
+                figures.append({'name': file[:-len('.json.gz')],
+                                'file': file,
+                                'type': 'json'})
+        # plotly.js is needed for rendering json figures in the index
+        if any(f['type'] == 'json' for f in figures):
+            self.save_plotlyjs(path)
+        # build list of links. file names are percent-encoded for urls and
+        # all values are escaped for html
+        items = '\n'.join('<li><a href="{0}" data-file="{0}" data-type="{1}">'
+                          '{2}</a></li>'.format(html.escape(quote(f['file'])),
+                                                html.escape(f['type']),
+                                                html.escape(f['name']))
+                          for f in figures)
+        file_index = os.path.join(path, 'index.html')
+        with open(file_index, 'w', encoding='utf-8') as f:
+            f.write(INDEX_TEMPLATE.replace('{items}', items))
+        logger.info('Saved index of {} figures to {}.',
+                    len(figures),
+                    file_index)
 
     def save_fig(self, image, fig, output_subdir, suffix, pad_inches=0):
         """
@@ -1153,9 +2002,123 @@ class Analysis:
         plt.savefig(path + file_no_path + suffix,
                     bbox_inches='tight',
                     pad_inches=pad_inches)
+        self.saved_files.append(path + file_no_path + suffix)
+        # keep figure for static export
+        if self.static_formats:
+            self.export_queue.append(('matplotlib',
+                                      pickle.dumps(fig),
+                                      file_no_path + os.path.splitext(suffix)[0],  # noqa: E501
+                                      pad_inches))
         # clear figure from memory
         plt.close(fig)
 
+    def load_figure_cache(self):
+        """
+        Load fingerprints of previously saved figures.
+
+        Returns:
+            dict: fingerprints mapped to lists of saved files.
+        """
+        file_cache = os.path.join(cs.settings.output_dir,
+                                  self.file_figure_cache)
+        try:
+            with open(file_cache) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return {}
+
+    def save_figure_cache(self):
+        """
+        Save fingerprints of saved figures.
+        """
+        file_cache = os.path.join(cs.settings.output_dir,
+                                  self.file_figure_cache)
+        with open(file_cache, 'w') as f:
+            json.dump(self.figure_cache, f, indent=1)
+
+    def fingerprint(self, name, params, code=None):
+        """
+        Fingerprint of a call to a plotting method. Includes input data,
+        arguments, settings of the object that affect the output and hash of
+        source code of the method.
+
+        Args:
+            name (str): name of plotting method.
+            params (dict): arguments of the call.
+            code (str, optional): hash of source code from get_code_hash.
+
+        Returns:
+            str: hex digest.
+        """
+        h = hashlib.sha1()
+        h.update(repr((name,
+                       code,
+                       self.output_mode,
+                       self.template,
+                       self.res,
+                       self.n_resamples,
+                       self.seed,
+                       self.max_points,
+                       self.density_bins,
+                       self.kp_max_points,
+                       self.kp_decimation,
+                       self.static_formats)).encode())
+        for key in sorted(params):
+            h.update(key.encode())
+            self.hash_value(h, params[key])
+        return h.hexdigest()
+
+    def hash_value(self, h, value):
+        """
+        Update hash with value of argument. Pandas objects are hashed by their
+        content, other values by their representation.
+
+        Args:
+            h (hashlib hash): hash object to update.
+            value (object): value to hash.
+        """
+        if isinstance(value, pd.DataFrame):
+            h.update(repr((value.shape,
+                           list(value.columns),
+                           list(value.dtypes.astype(str)))).encode())
+            h.update(self.hash_pandas(value.index).tobytes())
+            for i in range(value.shape[1]):
+                h.update(self.hash_pandas(value.iloc[:, i],
+                                          index=False).tobytes())
+        elif isinstance(value, (pd.Series, pd.Index)):
+            h.update(self.hash_pandas(value).tobytes())
+        elif isinstance(value, cs.analysis.RunningCorr):
+            h.update(repr(len(value)).encode())
+            self.hash_value(h, value.corr())
+        # keys that are not strings, e.g. index of columns, are not valid
+        # in json
+        elif isinstance(value, dict) and not all(isinstance(k, str)
+                                                 for k in value):
+            h.update(repr(sorted(value.items(), key=repr)).encode())
+        else:
+            h.update(json.dumps(value, sort_keys=True, default=str).encode())
+
+    def hash_pandas(self, obj, index=True):
+        """
+        Hash values of series or index. Values that cannot be hashed (e.g.,
+        lists with keypress data) are hashed by their pickled bytes.
+
+        Args:
+            obj (series or index): object to hash.
+            index (bool, optional): include index of series.
+
+        Returns:
+            ndarray: hashes of values.
+        """
+        if isinstance(obj, pd.Index):
+            index = False
+        try:
+            return pd.util.hash_pandas_object(obj, index=index).values
+        except TypeError:
+            # string representation of arrays is abbreviated, pickle is not
+            obj = obj.map(lambda v: hashlib.sha1(pickle.dumps(v)).hexdigest())
+            return pd.util.hash_pandas_object(obj, index=index).values
+
     def autolabel(self, ax, on_top=False, decimal=True):
         """
         Attach a text label above each bar in, displaying its height.
@@ -1224,26 +2187,184 @@ class Analysis:
         plt.rc('legend', fontsize=s_font)   # legend fontsize
         plt.rc('figure', titlesize=l_font)  # fontsize of the figure title
 
-    def get_conf_interval_bounds(self, data, conf_interval=0.95):
-        """Get lower and upper bounds of confidence interval.
+    def get_kp_matrix(self, df, column='kp', length=None):
+        """
+        Stack keypress data of rows in dataframe into a 2-D array. Shorter
+        rows are padded with zeros.
 
         Args:
-            data (list): list with data.
+            df (dataframe): dataframe with keypress data.
+            column (str, optional): column with keypress data.
+            length (int, optional): number of bins in output. Longer rows are
+                                    cut. Defaults to the longest row.
+
+        Returns:
+            ndarray, ndarray: keypress data with a row for each row in df and
+                              mask with True for bins with recorded data.
+        """
+        # rows without data (e.g., nan) are treated as empty
+        data = [np.asarray(kp, dtype=float).ravel()
+                if isinstance(kp, (list, tuple, np.ndarray))
+                else np.empty(0)
+                for kp in df[column]]
+        lengths = np.array([len(d) for d in data], dtype=int)
+        if length is None:
+            length = lengths.max() if len(lengths) else 0
+        lengths = np.minimum(lengths, length)
+        # mask of recorded bins
+        mask = np.arange(length) < lengths[:, np.newaxis]
+        # fill recorded bins in one go
+        kp = np.zeros(mask.shape)
+        if mask.any():
+            kp[mask] = np.concatenate([d[:n] for d, n in zip(data, lengths)])
+        return kp, mask
+
+    def get_filter_mask(self, df, variable, value):
+        """
+        Get mask of rows with given value of variable.
+
+        Args:
+            df (dataframe): dataframe to filter.
+            variable (str): column to filter on.
+            value (object): value of variable. Use np.nan to select rows
+                            with nan values.
+
+        Returns:
+            ndarray: boolean mask of rows.
+        """
+        # nan value
+        if pd.isnull(value):
+            return df[variable].isnull().values
+        # non-nan value
+        return (df[variable] == value).values
+
+    def get_kp_pp_matrix(self, df, length=None):
+        """
+        Keypress data of each participant averaged over stimuli in dataframe.
+        Stimuli shorter than length count as zeros after their end, like in
+        get_kp_matrix.
+
+        Args:
+            df (dataframe): mapping with column kp_pp from
+                            Heroku.process_kp.
+            length (int, optional): number of bins in output. Defaults to the
+                                    longest stimulus.
+
+        Returns:
+            ndarray: keypress data with a row for each participant, nan for
+                     participants without data. None if df has no data of
+                     individual participants.
+        """
+        if 'kp_pp' not in df.columns:
+            return None
+        data = [kp_pp for kp_pp in df['kp_pp']
+                if isinstance(kp_pp, np.ndarray)]
+        if not data:
+            return None
+        if length is None:
+            length = max(kp_pp.shape[1] for kp_pp in data)
+        # sums and counts of data of each participant
+        kp_sum = np.zeros((data[0].shape[0], length))
+        kp_count = np.zeros((data[0].shape[0], length))
+        for kp_pp in data:
+            kp_pp = kp_pp[:, :length]
+            present = ~np.isnan(kp_pp)
+            kp_sum[:, :kp_pp.shape[1]] += np.where(present, kp_pp, 0)
+            kp_count[:, :kp_pp.shape[1]] += present
+            # zeros after end of stimulus for participants that watched it
+            kp_count[:, kp_pp.shape[1]:] += present.any(axis=1)[:, np.newaxis]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return kp_sum / kp_count
+
+    def get_kp_conf_interval_bounds(self, df, length, conf_interval=0.95,
+                                    method='t'):
+        """
+        Get bounds of confidence interval for mean keypresses of stimuli in
+        dataframe. Data of individual participants is used if available,
+        otherwise stimuli are treated as observations.
+
+        Args:
+            df (dataframe): dataframe with keypress data.
+            length (int): number of bins.
+            conf_interval (float, optional): confidence interval value.
+            method (str, optional): 't' for t-interval, 'bootstrap' for
+                                    bootstrap interval.
+
+        Returns:
+            list of lists: lower and upper bounds.
+        """
+        data = self.get_kp_pp_matrix(df, length)
+        if data is None:
+            logger.warning('No keypress data of individual participants. '
+                           + 'Using stimuli for confidence interval.')
+            data, _ = self.get_kp_matrix(df, length=length)
+        return self.get_conf_interval_bounds(data, conf_interval, method)
+
+    def get_conf_interval_bounds(self, data, conf_interval=0.95, method='t'):
+        """Get lower and upper bounds of confidence interval for each bin.
+
+        Args:
+            data (ndarray): data with observations (e.g., participants) in
+                            rows and bins in columns. nan marks missing data.
             conf_interval (float, optional): confidence interval value.
+            method (str, optional): 't' for t-interval, 'bootstrap' for
+                                    bootstrap interval.
 
         Returns:
-            list of lsits: lower and uppoer bounds.
-        """
-        # calculate condidence interval
-        conf_interval = st.t.interval(conf_interval,
-                                      len(data) - 1,
-                                      loc=np.mean(data),
-                                      scale=st.sem(data))
-        # calcuate bounds
-        # todo: cross-check if correct
-        y_lower = data - conf_interval[0]
-        y_upper = data + conf_interval[1]
-        return y_lower, y_upper
+            list of lists: lower and upper bounds.
+        """
+        if method == 't':
+            return cs.analysis.bands.analytic(data, conf_interval)
+        elif method == 'bootstrap':
+            return cs.analysis.bands.bootstrap(data,
+                                               conf_interval,
+                                               n_resamples=self.n_resamples,
+                                               seed=self.seed,
+                                               n_jobs=self.n_jobs)
+        raise ValueError('Unknown method for confidence interval {}.'.format(
+            method))
+
+    def prettify(self, df, columns):
+        """
+        Prettify values of string columns for labels in plots. Columns are
+        turned into categoricals with pretty labels as categories, so that
+        labels are computed once per distinct value. The dataframe given is
+        not modified.
+
+        Args:
+            df (dataframe): dataframe with data.
+            columns (list): columns to prettify. Columns that are None, not
+                            in df or do not contain strings are skipped.
+
+        Returns:
+            dataframe: shallow copy of df with prettified columns.
+        """
+        df = df.copy(deep=False)
+        for column in columns:
+            # skip unused arguments and columns that are not in dataframe
+            try:
+                if column is None or column not in df.columns:
+                    continue
+            except TypeError:
+                continue
+            values = df[column]
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                # check if column contains strings
+                if (not pd.api.types.is_object_dtype(values)
+                        or not isinstance(values.iloc[0], str)):
+                    continue
+                values = values.astype('category')
+            categories = values.cat.categories
+            if not all(isinstance(c, str) for c in categories):
+                continue
+            # distinct values can have the same label, so labels are
+            # factorised and codes remapped
+            codes, labels = pd.factorize([pretty_label(c)
+                                          for c in categories])
+            # missing values keep code -1
+            codes = np.append(codes, -1)[values.cat.codes.values]
+            df[column] = pd.Categorical.from_codes(codes, categories=labels)
+        return df
 
     def slugify(self, value, allow_unicode=False):
         """
@@ -14,6 +14,8 @@ class Appen:
     appen_data = pd.DataFrame()
     # pandas dataframe with data per country
     countries_data = pd.DataFrame()
+    # worker codes of people filtered out of data
+    excluded = set()
     # pickle file for saving data
     file_p = 'appen_data.p'
     # csv file for saving data
@@ -78,6 +80,7 @@ class Appen:
                     old_shape,
                     self.appen_data.shape)
 
+    @cs.instrument.stage('appen.read_data')
     def read_data(self, filter_data=True, clean_data=True):
         """Read data into an attribute.
 
@@ -95,8 +98,9 @@ class Appen:
         # process data
         else:
             logger.info('Reading appen data from {}.', self.file_data)
-            # load from csv
-            df = pd.read_csv(self.file_data)
+            # load from csv, decompressed while reading if compressed
+            with cs.compression.open_file(self.file_data, 'rt') as f:
+                df = pd.read_csv(f)
             # drop legcy worker code column
             df = df.drop('worker_code', axis=1)
             # drop _gold columns
@@ -136,6 +140,7 @@ class Appen:
         # return df with data
         return df
 
+    @cs.instrument.stage('appen.filter_data')
     def filter_data(self, df):
         """Filter data based on the folllowing criteria:
             1. People who did not read instructions.
@@ -179,6 +184,8 @@ class Appen:
         # concatanate dfs with filtered data
         old_size = df.shape[0]
         df_filtered = pd.concat([df_1, df_2, df_3, df_4, df_5])
+        # worker codes of filtered people, e.g. to skip them in heroku data
+        self.excluded = set(df_filtered['worker_code'].dropna())
         # check if there are people to filter
         if not df_filtered.empty:
             # drop rows with filtered data
@@ -193,6 +200,7 @@ class Appen:
         # return df with data
         return df
 
+    @cs.instrument.stage('appen.clean_data')
     def clean_data(self, df, clean_years=True):
         """Clean data from unexpected values.
 
@@ -251,6 +259,7 @@ class Appen:
         # return df with data
         return df
 
+    @cs.instrument.stage('appen.mask_ips_ids')
     def mask_ips_ids(self, df, mask_ip=True, mask_id=True):
         """Anonymyse IPs and IDs. IDs are anonymised by subtracting the
         given ID from cs.common.get_configs('mask_id').
@@ -325,6 +334,7 @@ class Appen:
         # return dataframe with replaced values
         return df
 
+    @cs.instrument.stage('appen.process_countries')
     def process_countries(self):
         # todo: map textual questions to int
         # df for reassignment of textual values
@@ -353,7 +363,9 @@ class Appen:
                                       right_index=True,
                                       how='left')
         # drop not needed columns
-        df_country.drop(['unit_id', 'id', 'tainted', 'worker_id'], 1)
+        df_country = df_country.drop(['unit_id', 'id', 'tainted', 'worker_id'],
+                                     axis=1,
+                                     errors='ignore')
         # assign to attribute
         self.countries_data = df_country
         # save to csv
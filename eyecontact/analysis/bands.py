@@ -0,0 +1,118 @@
+# by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
+"""Confidence bands for curves of keypress data.
+
+Bands are calculated per bin from a 2-D array with a row for each observation
+(e.g., participant) and a column for each bin. Missing observations are given
+as nan.
+"""
+import numpy as np
+import scipy.stats as st
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import eyecontact as cs
+
+logger = cs.CustomLogger(__name__)  # use custom logger
+
+# upper limit on number of values in array of resampling weights per chunk
+max_chunk_values = 10_000_000
+
+
+def analytic(data, conf_interval=0.95):
+    """Per-bin t-interval around the mean of observations.
+
+    Args:
+        data (ndarray): observations in rows and bins in columns.
+        conf_interval (float, optional): confidence level.
+
+    Returns:
+        ndarray, ndarray: lower and upper bounds for each bin.
+    """
+    data = np.atleast_2d(np.asarray(data, dtype=float))
+    # number of observations in each bin
+    n = np.sum(~np.isnan(data), axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        mean = np.nanmean(data, axis=0)
+        sem = np.nanstd(data, axis=0, ddof=1) / np.sqrt(n)
+        t = st.t.ppf((1 + conf_interval) / 2, n - 1)
+    # bins with fewer than 2 observations get interval of zero width
+    margin = np.where(n > 1, t * sem, 0)
+    return mean - margin, mean + margin
+
+
+def bootstrap(data, conf_interval=0.95, n_resamples=1000, seed=None,
+              n_jobs=1):
+    """Per-bin percentile bootstrap interval of the mean of observations.
+    Observations (rows) are resampled with replacement. Resamples are drawn
+    in chunks, each with its own random stream spawned from seed, so results
+    do not depend on n_jobs.
+
+    Args:
+        data (ndarray): observations in rows and bins in columns.
+        conf_interval (float, optional): confidence level.
+        n_resamples (int, optional): number of bootstrap resamples.
+        seed (int, optional): seed for random numbers.
+        n_jobs (int, optional): number of worker processes.
+
+    Returns:
+        ndarray, ndarray: lower and upper bounds for each bin.
+    """
+    data = np.atleast_2d(np.asarray(data, dtype=float))
+    # rows without any data do not take part in resampling
+    data = data[~np.isnan(data).all(axis=1)]
+    if data.shape[0] < 2:
+        logger.warning('Bootstrap needs at least 2 observations, got {}.',
+                       data.shape[0])
+        mean = data[0] if data.shape[0] else np.full(data.shape[1], np.nan)
+        return mean, mean
+    # split resamples in chunks of bounded size
+    chunk_size = max(1, min(n_resamples, max_chunk_values // data.shape[0]))
+    sizes = [chunk_size] * (n_resamples // chunk_size)
+    if n_resamples % chunk_size:
+        sizes.append(n_resamples % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    logger.debug('Bootstrapping {} observations with {} resamples in {} '
+                 + 'chunks.', data.shape[0], n_resamples, len(sizes))
+    # draw resamples
+    if n_jobs > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs,
+                                 **cs.logmod.worker_init()) as pool:
+            means = list(pool.map(_bootstrap_chunk,
+                                  [data] * len(sizes),
+                                  sizes,
+                                  seeds))
+    else:
+        means = [_bootstrap_chunk(data, size, s)
+                 for size, s in zip(sizes, seeds)]
+    means = np.concatenate(means)
+    # percentiles of means of resamples
+    alpha = (1 - conf_interval) / 2
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        lower = np.nanpercentile(means, 100 * alpha, axis=0)
+        upper = np.nanpercentile(means, 100 * (1 - alpha), axis=0)
+    return lower, upper
+
+
+def _bootstrap_chunk(data, size, seed):
+    """Means of a chunk of bootstrap resamples. Each resample is given as
+    counts of draws of each observation, so all means in the chunk come from a
+    single matrix product.
+
+    Args:
+        data (ndarray): observations in rows and bins in columns.
+        size (int): number of resamples.
+        seed (SeedSequence): seed for random numbers of the chunk.
+
+    Returns:
+        ndarray: means of resamples in rows and bins in columns.
+    """
+    rng = np.random.default_rng(seed)
+    n = data.shape[0]
+    # number of times each observation is drawn in each resample
+    weights = rng.multinomial(n, np.full(n, 1 / n), size=size).astype(float)
+    # missing values do not count towards the mean of their bin
+    present = ~np.isnan(data)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (weights @ np.where(present, data, 0)) / (weights @ present)
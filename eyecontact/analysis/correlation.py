@@ -0,0 +1,119 @@
+# by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
+"""Incremental correlation matrix.
+
+Pearson correlation with pairwise-complete handling of missing values, the
+same as pandas.DataFrame.corr, computed from sums that are updated with new
+rows instead of recomputed over all data.
+"""
+import numpy as np
+import pandas as pd
+
+import eyecontact as cs
+
+logger = cs.CustomLogger(__name__)  # use custom logger
+
+
+class RunningCorr:
+    """Running sufficient statistics for a pairwise-complete correlation
+    matrix. For each pair of columns (i, j) it keeps over rows where both are
+    present: number of rows, sum of i, sum of squares of i and sum of cross
+    products. Values are shifted by means of the first batch with a column
+    to keep sums of squares accurate. Columns that appear in later batches
+    are added to the matrix; columns missing from a batch count as missing
+    values.
+
+    Examples
+    --------
+    >>> corr = RunningCorr()
+    >>> corr.update(df_1)
+    >>> corr.update(df_2)
+    >>> corr.corr()  # same as pd.concat([df_1, df_2]).corr()
+    """
+
+    def __init__(self):
+        # number of rows seen
+        self.rows = 0
+        self.columns = pd.Index([])
+        # shift of each column
+        self.shift = np.empty(0)
+        # number of rows with both columns present
+        self.n = np.empty((0, 0))
+        # sum of column in row over rows with both columns present
+        self.sx = np.empty((0, 0))
+        # sum of squares of column in row over rows with both present
+        self.sxx = np.empty((0, 0))
+        # sum of cross products
+        self.sxy = np.empty((0, 0))
+
+    def __len__(self):
+        """Number of rows seen so far."""
+        return self.rows
+
+    def update(self, df):
+        """Add rows to statistics. Only numeric and boolean columns are used.
+
+        Args:
+            df (dataframe): new rows.
+
+        Returns:
+            RunningCorr: self.
+        """
+        df = df.select_dtypes(include=[np.number, bool])
+        # add new columns
+        new = df.columns.difference(self.columns, sort=False)
+        if len(new):
+            self.add_columns(new, df[new])
+        x = df.reindex(columns=self.columns).to_numpy(dtype=float)
+        x = x - self.shift
+        present = ~np.isnan(x)
+        m = present.astype(float)
+        xz = np.where(present, x, 0)
+        self.n += m.T @ m
+        self.sx += xz.T @ m
+        self.sxx += (xz ** 2).T @ m
+        self.sxy += xz.T @ xz
+        self.rows += df.shape[0]
+        logger.debug('Updated correlation statistics with {} rows and {} '
+                     + 'columns.', df.shape[0], df.shape[1])
+        return self
+
+    def add_columns(self, columns, df):
+        """Extend statistics with columns, shifted by their means in df.
+
+        Args:
+            columns (index): names of columns.
+            df (dataframe): rows of new columns.
+        """
+        with np.errstate(invalid='ignore'):
+            shift = df.astype(float).mean().fillna(0).to_numpy()
+        k_old = len(self.columns)
+        k = k_old + len(columns)
+        self.columns = self.columns.append(pd.Index(columns))
+        self.shift = np.concatenate((self.shift, shift))
+        for name in ['n', 'sx', 'sxx', 'sxy']:
+            stat = np.zeros((k, k))
+            stat[:k_old, :k_old] = getattr(self, name)
+            setattr(self, name, stat)
+
+    def corr(self, min_periods=1):
+        """Correlation matrix of rows seen so far.
+
+        Args:
+            min_periods (int, optional): minimum number of rows with both
+                                         columns present to give a value.
+
+        Returns:
+            dataframe: correlation matrix with columns in order of their first
+                       appearance.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = self.sxy - self.sx * self.sx.T / self.n
+            var = self.sxx - self.sx ** 2 / self.n
+            r = cov / np.sqrt(var * var.T)
+        # values outside [-1, 1] are rounding errors
+        r = np.clip(r, -1, 1)
+        # columns without variance have no correlation. Variance is compared
+        # to sum of squares to ignore rounding errors
+        constant = ~(var > 1e-12 * self.sxx)
+        r[(self.n < max(min_periods, 2)) | constant | constant.T] = np.nan
+        return pd.DataFrame(r, index=self.columns, columns=self.columns)
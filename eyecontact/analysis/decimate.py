@@ -0,0 +1,131 @@
+# by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
+"""Decimation of line traces for plotting.
+
+Each function takes x and y values of a trace with x sorted in ascending order
+and returns indices of points to keep, so that the same selection can be
+applied to other arrays aligned with the trace.
+"""
+import numpy as np
+
+import eyecontact as cs
+
+logger = cs.CustomLogger(__name__)  # use custom logger
+
+# supported methods of decimation
+methods = ['lttb', 'minmax']
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets. Keeps first and last point and in each
+    bucket in between the point forming the largest triangle with the point
+    kept in the previous bucket and the mean of the next bucket.
+
+    Args:
+        x (ndarray): x values.
+        y (ndarray): y values.
+        n_out (int): number of points to keep.
+
+    Returns:
+        ndarray: indices of points to keep.
+    """
+    x = np.asarray(x, dtype=float)
+    # missing values do not attract selection
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n) if n_out >= n else np.array([0, n - 1])
+    # edges of buckets between first and last point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    # mean of each bucket, used as third vertex of triangle
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    mean_x = np.append(sums_x / sizes, x[-1])
+    mean_y = np.append(sums_y / sizes, y[-1])
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # doubled area of triangles with vertices a, candidate, next mean
+        area = np.abs((x[a] - mean_x[i + 1]) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (mean_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(x, y, n_out):
+    """Min/max envelope. Splits points in n_out / 2 buckets and keeps the
+    minimum and the maximum of each bucket, so that peaks are never lost.
+
+    Args:
+        x (ndarray): x values.
+        y (ndarray): y values.
+        n_out (int): number of points to keep.
+
+    Returns:
+        ndarray: indices of points to keep.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    n_buckets = max(1, n_out // 2)
+    if n_out >= n:
+        return np.arange(n)
+    # bucket of each point
+    buckets = np.arange(n) * n_buckets // n
+    # missing values are neither minimum nor maximum
+    values = np.where(np.isnan(y), np.inf, y)
+    order = np.lexsort((values, buckets))
+    first = np.searchsorted(buckets[order], np.arange(n_buckets))
+    idx_min = order[first]
+    values = np.where(np.isnan(y), -np.inf, y)
+    order = np.lexsort((values, buckets))
+    last = np.searchsorted(buckets[order], np.arange(n_buckets), 'right') - 1
+    idx_max = order[last]
+    return np.unique(np.concatenate((idx_min, idx_max)))
+
+
+def envelope(x, y, n_out, side):
+    """One side of an envelope: maximum or minimum of y in each of n_out
+    buckets. Used for bands, which need the same x values on both sides.
+
+    Args:
+        x (ndarray): x values.
+        y (ndarray): y values.
+        n_out (int): number of points to keep.
+        side (str): 'upper' for maximum, 'lower' for minimum.
+
+    Returns:
+        ndarray, ndarray: x values (first of each bucket) and y values.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if n_out >= len(y):
+        return x, y
+    starts = np.linspace(0, len(y), n_out, endpoint=False).astype(int)
+    reduce = np.fmax if side == 'upper' else np.fmin
+    return x[starts], reduce.reduceat(y, starts)
+
+
+def decimate(x, y, n_out, method='lttb'):
+    """Decimate trace with given method.
+
+    Args:
+        x (ndarray): x values.
+        y (ndarray): y values.
+        n_out (int): number of points to keep.
+        method (str, optional): 'lttb' or 'minmax'.
+
+    Returns:
+        ndarray, ndarray: decimated x and y values.
+    """
+    if method == 'lttb':
+        idx = lttb(x, y, n_out)
+    elif method == 'minmax':
+        idx = minmax(x, y, n_out)
+    else:
+        raise ValueError('Unknown decimation method {}. Use one of {}.'.format(
+            method, methods))
+    return np.asarray(x)[idx], np.asarray(y)[idx]
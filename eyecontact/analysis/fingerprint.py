@@ -0,0 +1,120 @@
+# by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
+"""Fingerprints of rows of heroku data for detection of duplicates.
+
+Clients retry POST requests with blocks of data, and the server stores each
+attempt, so the same block can be stored more than once. A row is identified
+by the code of the worker and the trial index and elapsed time of each of its
+cells, hashed to 64 bits. Fingerprints are kept in an open-addressing hash set
+of 64-bit integers, which is at most half full and doubles when full, so it
+needs 16 to 32 bytes per row.
+"""
+import hashlib
+import numpy as np
+
+import eyecontact as cs
+
+logger = cs.CustomLogger(__name__)  # use custom logger
+
+
+def fingerprint(worker_code, cells):
+    """64-bit fingerprint of row of data.
+
+    Args:
+        worker_code (str): code of worker.
+        cells (list): cells of jsPsych in row.
+
+    Returns:
+        int: fingerprint.
+    """
+    h = hashlib.blake2b(digest_size=8)
+    h.update(str(worker_code).encode('utf-8'))
+    for cell in cells:
+        h.update('|{}:{}'.format(cell.get('trial_index'),
+                                 cell.get('time_elapsed')).encode('utf-8'))
+    return int.from_bytes(h.digest(), 'little')
+
+
+class FingerprintSet:
+    """Set of 64-bit fingerprints with linear probing in an array, which is
+    doubled when it gets half full.
+
+    Examples
+    --------
+    >>> seen = FingerprintSet()
+    >>> seen.add(fingerprint('W1', cells))
+    True
+    >>> seen.add(fingerprint('W1', cells))
+    False
+    """
+
+    def __init__(self, capacity=1024):
+        # capacity is a power of two, 0 marks empty slots
+        capacity = 1 << max(4, int(capacity - 1).bit_length())
+        self.slots = np.zeros(capacity, dtype=np.uint64)
+        self.mask = capacity - 1
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, value):
+        value = value or 1
+        i = value & self.mask
+        while True:
+            slot = int(self.slots[i])
+            if slot == value:
+                return True
+            if slot == 0:
+                return False
+            i = (i + 1) & self.mask
+
+    def add(self, value):
+        """Add fingerprint.
+
+        Args:
+            value (int): fingerprint.
+
+        Returns:
+            bool: True if fingerprint was not in set.
+        """
+        # 0 marks empty slots
+        value = value or 1
+        i = value & self.mask
+        while True:
+            slot = int(self.slots[i])
+            if slot == value:
+                return False
+            if slot == 0:
+                break
+            i = (i + 1) & self.mask
+        self.slots[i] = value
+        self.size += 1
+        if self.size * 2 > len(self.slots):
+            self.grow()
+        return True
+
+    def grow(self):
+        """Double capacity and insert fingerprints again. All fingerprints
+        are probed at once: in each step, fingerprints at empty slots are
+        placed (the first one, if several share a slot) and the others move
+        to the next slot.
+        """
+        values = self.slots[self.slots != 0]
+        self.slots = np.zeros(len(self.slots) * 2, dtype=np.uint64)
+        self.mask = len(self.slots) - 1
+        mask = np.uint64(self.mask)
+        positions = values & mask
+        while values.size:
+            free = np.flatnonzero(self.slots[positions] == 0)
+            _, first = np.unique(positions[free], return_index=True)
+            placed = free[first]
+            self.slots[positions[placed]] = values[placed]
+            left = np.ones(values.size, dtype=bool)
+            left[placed] = False
+            values = values[left]
+            positions = (positions[left] + np.uint64(1)) & mask
+
+    @property
+    def nbytes(self):
+        """Memory of slots in bytes."""
+        return self.slots.nbytes
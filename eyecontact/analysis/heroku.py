@@ -1,9 +1,6 @@
 # by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
-import json
-import os
 import pandas as pd
 import numpy as np
-from tqdm import tqdm
 import re
 import ast
 from statistics import mean
@@ -17,10 +14,11 @@ pd.options.mode.chained_assignment = None  # default='warn'
 logger = cs.CustomLogger(__name__)  # use custom logger
 
 
-# todo: parse browser interactions
 class Heroku:
     # pandas dataframe with extracted data
     heroku_data = pd.DataFrame()
+    # pandas dataframe with browser interaction events in long format
+    events = pd.DataFrame()
     # pandas dataframe with mapping
     mapping = pd.read_csv(cs.common.get_configs('mapping_stimuli'))
     # resolution for keypress data
@@ -37,8 +35,14 @@ class Heroku:
     file_p = 'heroku_data.p'
     # csv file for saving data
     file_data_csv = 'heroku_data'
+    # pickle file for saving browser interaction events
+    file_events_p = 'heroku_events.p'
+    # csv file for saving browser interaction events
+    file_events_csv = 'heroku_events'
     # csv file for mapping of stimuli
     file_mapping_csv = 'mapping'
+    # columns of mapping not saved to csv
+    columns_no_csv = ['kp_pp']
     # keys with meta information
     meta_keys = ['worker_code',
                  'browser_user_agent',
@@ -53,6 +57,8 @@ class Heroku:
     prefixes = {'stimulus': 'video_'}  # noqa: E501
     # stimulus duration
     default_dur = 0
+    # columns with data of stimuli: stimulus-field-repetition
+    column_pattern = re.compile(r'^(.+)-([a-z]+)-(\d+)$')
 
     def __init__(self,
                  files_data: list,
@@ -67,6 +73,8 @@ class Heroku:
         self.load_p = load_p
         # save data as csv file
         self.save_csv = save_csv
+        # positions of columns by (stimulus, field, repetition)
+        self.columns_index = {}
 
     def set_data(self, heroku_data):
         """
@@ -74,16 +82,22 @@ class Heroku:
         """
         old_shape = self.heroku_data.shape  # store old shape for logging
         self.heroku_data = heroku_data
+        self.columns_index = self.parse_columns(heroku_data.columns)
         logger.info('Updated heroku_data. Old shape: {}. New shape: {}.',
                     old_shape,
                     self.heroku_data.shape)
 
-    def read_data(self, filter_data=True):
+    @cs.instrument.stage('heroku.read_data')
+    def read_data(self, filter_data=True, exclude=None):
         """
         Read data into an attribute.
 
         Args:
             filter_data (bool, optional): flag for filtering data.
+            exclude (iterable, optional): worker codes of people excluded
+                                          from analysis, e.g. Appen.excluded.
+                                          Their rows are skipped before cells
+                                          are parsed.
 
         Returns:
             dataframe: udpated dataframe.
@@ -92,27 +106,45 @@ class Heroku:
         if self.load_p:
             df = cs.common.load_from_p(self.file_p,
                                        'heroku data')
+            # pickles saved before events were parsed have no events
+            try:
+                events = cs.common.load_from_p(self.file_events_p,
+                                               'heroku events')
+            except FileNotFoundError:
+                logger.warning('No pickle file with heroku events {}.',
+                               self.file_events_p)
+                events = pd.DataFrame()
         # process data
         else:
-            # read files with heroku data one by one
-            data_list = []
             data_dict = {}  # dictionary with data
-            for file in self.files_data:
-                logger.info('Reading heroku data from {}.', file)
-                f = open(file, 'r')
-                # add data from the file to the dictionary
-                data_list += f.readlines()
-                f.close()
             # hold info on previous row for worker
             prev_row_info = pd.DataFrame(columns=['worker_code',
                                                   'time_elapsed'])
             prev_row_info.set_index('worker_code', inplace=True)
-            # read rows in data
-            for row in tqdm(data_list):  # tqdm adds progress bar
+            # read rows in data, streamed from files one by one
+            progress = cs.progress.Progress('heroku.read_data', unit='rows')
+            # fingerprints of rows for dropping of duplicated rows
+            seen = cs.analysis.fingerprint.FingerprintSet()
+            duplicates = 0
+            # worker codes with rows to skip
+            exclude = set(exclude) if exclude is not None else set()
+            excluded = 0
+            # browser interaction events as keys (worker_code, trial, event,
+            # time), without events repeated in cells
+            events = {}
+            # ID of stimulus and repetition of trials as (worker_code, trial):
+            # (stimulus, repetition)
+            trials = {}
+            # count of trials with each stimulus for each worker
+            stim_reps = {}
+            # IDs of stimuli, parsed once for each path of stimulus
+            resolver = cs.analysis.stimuli.StimulusResolver(self.prefixes,
+                                                            self.mapping)
+            for cells, size in progress.wrap(self.read_rows()):
                 # use dict to store data
                 dict_row = {}
-                # load data from a single row into a list
-                list_row = json.loads(row)
+                # count size of row
+                progress.update(0, bytes=size, cells=len(cells))
                 # last found stimulus
                 stim_name = ''
                 # trial last found stimulus
@@ -121,9 +153,21 @@ class Heroku:
                 elapsed_l = 0
                 # record worker_code in the row. assuming that each row has at
                 # least one worker_code
-                worker_code = [d['worker_code'] for d in list_row['data'] if 'worker_code' in d][0]  # noqa: E501
+                worker_code = [d['worker_code'] for d in cells if 'worker_code' in d][0]  # noqa: E501
+                # skip row of excluded person
+                if worker_code in exclude:
+                    excluded += 1
+                    progress.update(0, excluded=1)
+                    continue
+                # skip row stored more than once, e.g. after retried POST
+                row_fp = cs.analysis.fingerprint.fingerprint(worker_code,
+                                                             cells)
+                if not seen.add(row_fp):
+                    duplicates += 1
+                    progress.update(0, duplicates=1)
+                    continue
                 # go over cells in the row with data
-                for data_cell in list_row['data']:
+                for data_cell in cells:
                     # extract meta info form the call
                     for key in self.meta_keys:
                         if key in data_cell.keys():
@@ -134,41 +178,36 @@ class Heroku:
                                              data_cell['worker_code'])
                     # check if stimulus data is present
                     if 'stimulus' in data_cell.keys():
-                        # extract name of stimulus after last slash
-                        # list of stimuli. use 1st
-                        if isinstance(data_cell['stimulus'], list):
-                            stim_no_path = data_cell['stimulus'][0].rsplit('/', 1)[-1]  # noqa: E501
-                        # single stimulus
-                        else:
-                            stim_no_path = data_cell['stimulus'].rsplit('/', 1)[-1]  # noqa: E501
-                        # remove extension
-                        stim_no_path = os.path.splitext(stim_no_path)[0]
-                        # Check if it is a block with stimulus and not an
-                        # instructions block
-                        if (cs.common.search_dict(self.prefixes, stim_no_path)  # noqa: E501
-                           is not None):
-                            # stimulus is found
-                            logger.debug('Found stimulus {}.', stim_no_path)
-                            if self.prefixes['stimulus'] in stim_no_path:
-                                # Record that stimulus was detected for the
-                                # cells to follow
-                                stim_name = stim_no_path
-                                # record trial of stimulus
-                                stim_trial = data_cell['trial_index']
-                                # add trial duration
-                                if 'time_elapsed' in data_cell.keys():
-                                    # positive time elapsed from las cell
-                                    if elapsed_l:
-                                        time = elapsed_l
-                                    # non-positive time elapsed. use value from
-                                    # the known cell for worker
-                                    else:
-                                        time = prev_row_info.loc[worker_code, 'time_elapsed']  # noqa: E501
-                                    # calculate duration
-                                    dur = float(data_cell['time_elapsed']) - time  # noqa: E501
-                                    if stim_name + '-dur' not in dict_row.keys() and dur > 0:  # noqa: E501
-                                        # first value
-                                        dict_row[stim_name + '-dur'] = dur  # noqa: E501
+                        # ID of stimulus, None if it is not a block with
+                        # stimulus, e.g. an instructions block
+                        stim_id = resolver.resolve(data_cell['stimulus'])
+                        if stim_id is not None:
+                            # Record that stimulus was detected for the cells
+                            # to follow
+                            stim_name = resolver.names[stim_id]
+                            logger.debug('Found stimulus {}.', stim_name)
+                            # record trial of stimulus
+                            stim_trial = data_cell['trial_index']
+                            # record stimulus and repetition of trial
+                            if (worker_code, stim_trial) not in trials:
+                                rep = stim_reps.get((worker_code, stim_id), 0)
+                                stim_reps[(worker_code, stim_id)] = rep + 1
+                                trials[(worker_code, stim_trial)] = (stim_id,
+                                                                     rep)
+                            # add trial duration
+                            if 'time_elapsed' in data_cell.keys():
+                                # positive time elapsed from las cell
+                                if elapsed_l:
+                                    time = elapsed_l
+                                # non-positive time elapsed. use value from
+                                # the known cell for worker
+                                else:
+                                    time = prev_row_info.loc[worker_code, 'time_elapsed']  # noqa: E501
+                                # calculate duration
+                                dur = float(data_cell['time_elapsed']) - time
+                                if stim_name + '-dur' not in dict_row.keys() and dur > 0:  # noqa: E501
+                                    # first value
+                                    dict_row[stim_name + '-dur'] = dur
                     # keypresses
                     if 'rts' in data_cell.keys() and stim_name != '':
                         # record given keypresses
@@ -256,17 +295,23 @@ class Heroku:
                             # previous values found
                             dict_row[stim_name + '-qi'].extend(injection_q)
                     # browser interaction events
-                    if 'interactions' in data_cell.keys() and stim_name != '':
+                    if 'interactions' in data_cell.keys():
                         interactions = data_cell['interactions']
                         logger.debug('Found {} browser interactions.',
                                      len(interactions))
-                        # extract events and timestamps
-                        event = []
-                        time = []
-                        for interation in interactions:
-                            if interation['trial'] == stim_trial:
-                                event.append(interation['event'])
-                                time.append(interation['time'])
+                        # group events by trial in one pass over them
+                        interactions_trial = {}
+                        for interaction in interactions:
+                            interactions_trial.setdefault(interaction['trial'], []).append(interaction)  # noqa: E501
+                            events[(worker_code,
+                                    interaction['trial'],
+                                    interaction['event'],
+                                    interaction['time'])] = None
+                    if 'interactions' in data_cell.keys() and stim_name != '':
+                        # extract events and timestamps of trial of stimulus
+                        interactions = interactions_trial.get(stim_trial, [])
+                        event = [i['event'] for i in interactions]
+                        time = [i['time'] for i in interactions]
                         # Check if inputted values were recorded previously
                         if stim_name + '-event' not in dict_row.keys():
                             # first value
@@ -358,9 +403,21 @@ class Heroku:
                         dict_row[key + '-0'] = dict_row.pop(key)
                     # add row of data
                     data_dict[dict_row['worker_code']] = dict_row
+            logger.info('Dropped {} duplicated rows of {} rows ({} KB of '
+                        + 'fingerprints).',
+                        duplicates,
+                        progress.counts['rows'],
+                        seen.nbytes // 1024)
+            if exclude:
+                logger.info('Skipped {} rows of excluded people ({} worker '
+                            + 'codes).',
+                            excluded,
+                            len(exclude))
             # turn into pandas dataframe
             df = pd.DataFrame(data_dict)
             df = df.transpose()
+            # table of events in trials with stimuli
+            events = self.make_events(events, trials, resolver.names)
             # report people that attempted study
             unique_worker_codes = df['worker_code'].drop_duplicates()
             logger.info('People who attempted to participate: {}',
@@ -368,6 +425,8 @@ class Heroku:
             # filter data
             if filter_data:
                 df = self.filter_data(df)
+                events = events[events['worker_code'].isin(df['worker_code'])]  # noqa: E501
+                events = events.reset_index(drop=True)
             # sort columns alphabetically
             df = df.reindex(sorted(df.columns), axis=1)
             # move worker_code to the front
@@ -377,6 +436,7 @@ class Heroku:
         # save to pickle
         if self.save_p:
             cs.common.save_to_p(self.file_p, df, 'heroku data')
+            cs.common.save_to_p(self.file_events_p, events, 'heroku events')
         # save to csv
         if self.save_csv:
             # todo: check whith index=False is needed here
@@ -384,11 +444,138 @@ class Heroku:
                       '.csv', index=False)
             logger.info('Saved heroku data to csv file {}',
                         self.file_data_csv + '.csv')
+            events.to_csv(cs.settings.output_dir + '/' +
+                          self.file_events_csv + '.csv', index=False)
+            logger.info('Saved heroku events to csv file {}',
+                        self.file_events_csv + '.csv')
         # update attribute
         self.heroku_data = df
+        self.events = events
+        # index of columns
+        self.columns_index = self.parse_columns(df.columns)
         # return df with data
         return df
 
+    def read_rows(self):
+        """
+        Rows of heroku data in files self.files_data, one at a time. Files
+        can have a JSON object per line, as exported by mongoexport, or be
+        .bson dumps of mongodump, and be compressed (.gz, .bz2, .xz, .zst).
+        Cells of jsPsych are taken out of the data envelope of each entry.
+
+        Yields:
+            list, int: cells of row and size of row in bytes.
+        """
+        for file in self.files_data:
+            logger.info('Reading heroku data from {}.', file)
+            yield from cs.analysis.mongo.read_entries(file)
+
+    @staticmethod
+    def make_events(events, trials, names):
+        """
+        Table of browser interaction events in trials with stimuli, in long
+        format with a row per event. Events in other trials are dropped.
+
+        Args:
+            events (iterable): (worker_code, trial, event, time) of events.
+            trials (dict): (ID of stimulus, repetition) for (worker_code,
+                           trial) of trials with stimuli.
+            names (list): names of stimuli by ID.
+
+        Returns:
+            dataframe: worker_code, stimulus, rep, trial, event and time of
+                       events.
+        """
+        columns = ['worker_code', 'stimulus', 'rep', 'trial', 'event', 'time']
+        df = pd.DataFrame(list(events),
+                          columns=['worker_code', 'trial', 'event', 'time'])
+        df_trials = pd.DataFrame([key + value for key, value in trials.items()],  # noqa: E501
+                                 columns=['worker_code', 'trial', 'stimulus',
+                                          'rep'])
+        # join events with trials of stimuli
+        df = df.merge(df_trials, on=['worker_code', 'trial'], how='inner')
+        # names of stimuli as categories with IDs as codes
+        df['stimulus'] = pd.Categorical.from_codes(
+            df['stimulus'].astype(int), names)
+        df = df[columns].astype({'worker_code': 'category',
+                                 'rep': 'int16',
+                                 'trial': 'int32',
+                                 'event': 'category',
+                                 'time': 'float64'})
+        logger.info('Found {} browser interaction events in trials with '
+                    + 'stimuli.',
+                    df.shape[0])
+        return df
+
+    def count_events(self):
+        """
+        Number of browser interaction events of each type (blur, focus,
+        fullscreenexit) in each trial with a stimulus in self.events.
+
+        Returns:
+            dataframe: counts of events with index worker_code, stimulus and
+                       rep, and a column per event.
+        """
+        return self.events.groupby(['worker_code', 'stimulus', 'rep', 'event'],
+                                   observed=True).size().unstack(fill_value=0)
+
+    @staticmethod
+    def parse_columns(columns):
+        """
+        Index of columns with data of stimuli, named as
+        stimulus-field-repetition (e.g., video_0-rt-1). Other columns are not
+        indexed.
+
+        Args:
+            columns (list): names of columns.
+
+        Returns:
+            dict: positions of columns with tuples (stimulus, field,
+                  repetition) as keys.
+        """
+        index = {}
+        for pos, column in enumerate(columns):
+            match = Heroku.column_pattern.match(str(column))
+            if match:
+                key = (match.group(1), match.group(2), int(match.group(3)))
+                # keep first column with the name
+                index.setdefault(key, pos)
+        return index
+
+    @staticmethod
+    def filter_positions(columns_index, field=None, stimulus=None, rep=None):
+        """
+        Positions of columns in index matching given parts of name.
+
+        Args:
+            columns_index (dict): index from parse_columns.
+            field (str, optional): field (e.g., 'dur'). Any if None.
+            stimulus (str, optional): stimulus (e.g., 'video_0'). Any if None.
+            rep (int, optional): repetition. Any if None.
+
+        Returns:
+            list: sorted positions of columns.
+        """
+        return sorted(pos for (s, f, r), pos in columns_index.items()
+                      if (field is None or f == field)
+                      and (stimulus is None or s == stimulus)
+                      and (rep is None or r == rep))
+
+    def get_positions(self, field=None, stimulus=None, rep=None):
+        """
+        Positions of columns in heroku data matching given parts of name.
+
+        Args:
+            field (str, optional): field (e.g., 'dur'). Any if None.
+            stimulus (str, optional): stimulus (e.g., 'video_0'). Any if None.
+            rep (int, optional): repetition. Any if None.
+
+        Returns:
+            list: sorted positions of columns.
+        """
+        return self.filter_positions(self.columns_index, field, stimulus, rep)
+
+    @cs.instrument.stage('heroku.read_mapping')
     def read_mapping(self):
         """
         Read mapping.
@@ -402,6 +589,7 @@ class Heroku:
         # return mapping as a dataframe
         return df
 
+    @cs.instrument.stage('heroku.process_kp')
     def process_kp(self, filter_length=True):
         """Process keypresses for resolution self.res.
 
@@ -415,100 +603,189 @@ class Heroku:
         logger.info('Processing keypress data with res={} ms.', self.res)
         # array to store all binned rt data in
         mapping_rt = []
+        # array to store binned rt data of each participant in
+        mapping_pp = []
         # counter of videos filtered because of length
         counter_filtered = 0
         # loop through all stimuli
-        for num in tqdm(range(self.num_stimuli)):
+        progress = cs.progress.Progress('heroku.process_kp',
+                                        total=self.num_stimuli,
+                                        unit='stimuli')
+        for num in progress.wrap(range(self.num_stimuli)):
             video_kp = []
             # video ID
             video_id = 'video_' + str(num)
+            # extract video length
+            video_len = self.mapping.loc[video_id]['video_length']
+            # number of bins
+            num_bins = len(range(self.res, video_len + self.res, self.res))
+            # binned keypresses of each participant in each repetition
+            video_pp = np.full((self.num_repeat,
+                                self.heroku_data.shape[0],
+                                num_bins),
+                               np.nan)
             for rep in range(self.num_repeat):
-                # add suffix with repetition ID
-                video_rt = 'video_' + str(num) + '-rt-' + str(rep)
-                video_dur = 'video_' + str(num) + '-dur-' + str(rep)
-                # extract video length
-                video_len = self.mapping.loc[video_id]['video_length']
+                # positions of columns with keypresses and durations
+                pos_rt = self.columns_index.get((video_id, 'rt', rep))
+                pos_dur = self.columns_index.get((video_id, 'dur', rep))
+                if pos_rt is None:
+                    continue
+                col_data = self.heroku_data.iloc[:, pos_rt]
+                # consider only videos of allowed length
+                if pos_dur is not None and filter_length:
+                    durs = self.heroku_data.iloc[:, pos_dur].values
                 rt_data = []
                 counter_data = 0
-                for (col_name, col_data) in self.heroku_data.iteritems():
-                    # find the right column to loop through
-                    if video_rt == col_name:
-                        # loop through rows in column
-                        for pp, row in enumerate(col_data):
-                            # consider only videos of allowed length
-                            if (video_dur in self.heroku_data.keys()
-                                    and filter_length):
-                                # extract recorded duration
-                                dur = self.heroku_data.iloc[pp][video_dur]
-                                # check if duration is within limits
-                                if (dur < self.mapping['min_dur'][video_id]
-                                        or dur > self.mapping['max_dur'][video_id]):  # noqa: E501
-                                    # increase counter of filtered videos
-                                    logger.debug('Filtered keypress data from '
-                                                 + 'video {} of detected '
-                                                 + 'duration of {} for '
-                                                 + 'worker {}.',
-                                                 video_id, dur,
-                                                 self.heroku_data.index[pp])
-                                    # increase counter of filtered videos
-                                    counter_filtered = counter_filtered + 1
-                                    continue
-                            # check if data is string to filter out nan data
-                            if type(row) == list:
-                                # saving amount of times the video has been
-                                # watched
-                                counter_data = counter_data + 1
-                                # if list contains only one value, append to
-                                # rt_data
-                                if len(row) == 1:
-                                    rt_data.append(row[0])
-                                # if list contains more then one value, go
-                                # through list to remove keyholds
-                                elif len(row) > 1:
-                                    for j in range(1, len(row)):
-                                        # if time between 2 stimuli is more
-                                        # than 35 ms, add to array (no hold)
-                                        if row[j] - row[j - 1] > 35:
-                                            # append buttonpress data to rt
-                                            # array
-                                            rt_data.append(row[j])
-                        # if all data for one video was found, divide them in
-                        # bins
-                        kp = []
-                        # loop over all bins, dependent on resolution
-                        for rt in range(self.res, video_len + self.res,
-                                        self.res):
-                            bin_counter = 0
-                            for data in rt_data:
-                                # go through all video data to find all data
-                                # within specific bin
-                                if rt - self.res < data <= rt:
-                                    # if data is found, up bin counter
-                                    bin_counter = bin_counter + 1
-                            if counter_data:
-                                percentage = bin_counter / counter_data
-                                kp.append(round(percentage * 100))
-                            else:
-                                kp.append(0)
-                        # store keypresses from repetition
-                        video_kp.append(kp)
-                        break
+                # loop through rows in column
+                for pp, row in enumerate(col_data):
+                    # consider only videos of allowed length
+                    if pos_dur is not None and filter_length:
+                        # extract recorded duration
+                        dur = durs[pp]
+                        # check if duration is within limits
+                        if (dur < self.mapping['min_dur'][video_id]
+                                or dur > self.mapping['max_dur'][video_id]):
+                            # increase counter of filtered videos
+                            logger.debug('Filtered keypress data from '
+                                         + 'video {} of detected '
+                                         + 'duration of {} for '
+                                         + 'worker {}.',
+                                         video_id, dur,
+                                         self.heroku_data.index[pp])
+                            # increase counter of filtered videos
+                            counter_filtered = counter_filtered + 1
+                            continue
+                    # check if data is string to filter out nan data
+                    if type(row) == list:
+                        # saving amount of times the video has been watched
+                        counter_data = counter_data + 1
+                        # keypresses of participant
+                        pp_data = []
+                        # if list contains only one value, append to rt_data
+                        if len(row) == 1:
+                            pp_data.append(row[0])
+                        # if list contains more then one value, go through
+                        # list to remove keyholds
+                        elif len(row) > 1:
+                            for j in range(1, len(row)):
+                                # if time between 2 stimuli is more than 35
+                                # ms, add to array (no hold)
+                                if row[j] - row[j - 1] > 35:
+                                    # append buttonpress data to rt array
+                                    pp_data.append(row[j])
+                        rt_data.extend(pp_data)
+                        # bin keypresses of participant. bin k holds values
+                        # in (k * res, (k + 1) * res]
+                        bins = np.ceil(np.array(pp_data, dtype=float)
+                                       / self.res).astype(int) - 1
+                        bins = bins[(bins >= 0) & (bins < num_bins)]
+                        video_pp[rep, pp] = np.bincount(
+                            bins, minlength=num_bins) * 100
+                # if all data for one video was found, divide them in bins
+                kp = []
+                # loop over all bins, dependent on resolution
+                for rt in range(self.res, video_len + self.res, self.res):
+                    bin_counter = 0
+                    for data in rt_data:
+                        # go through all video data to find all data within
+                        # specific bin
+                        if rt - self.res < data <= rt:
+                            # if data is found, up bin counter
+                            bin_counter = bin_counter + 1
+                    if counter_data:
+                        percentage = bin_counter / counter_data
+                        kp.append(round(percentage * 100))
+                    else:
+                        kp.append(0)
+                # store keypresses from repetition
+                video_kp.append(kp)
             # calculate mean keypresses from all repetitions
             kp_mean = [*map(mean, zip(*video_kp))]
             # append data from one video to the mapping array
             mapping_rt.append(kp_mean)
+            # mean keypresses of each participant from all repetitions. rows
+            # of participants without data are nan
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', category=RuntimeWarning)
+                mapping_pp.append(np.nanmean(video_pp, axis=0))
         logger.info('Filtered out keypress data from {} videos with '
                     + 'unexpected length.', counter_filtered)
         # update own mapping to include keypress data
         self.mapping['kp'] = mapping_rt
+        # keypress data of each participant as array with a row for each row
+        # in heroku_data. object array stops pandas from unpacking arrays
+        kp_pp = np.empty(len(mapping_pp), dtype=object)
+        for i, data in enumerate(mapping_pp):
+            kp_pp[i] = data
+        self.mapping['kp_pp'] = kp_pp
         # save to csv
         if self.save_csv:
-            # save to csv
-            self.mapping.to_csv(cs.settings.output_dir + '/' +
-                                self.file_mapping_csv + '.csv')
+            self.save_mapping_csv()
         # return new mapping
         return self.mapping
 
+    def save_mapping_csv(self):
+        """
+        Save mapping to csv file. Keypress data of individual participants is
+        too large for a csv file and is not saved.
+        """
+        self.mapping.drop(columns=self.columns_no_csv,
+                          errors='ignore').to_csv(cs.settings.output_dir +
+                                                  '/' +
+                                                  self.file_mapping_csv +
+                                                  '.csv')
+
+    def get_answers_long(self):
+        """Answers to post-stimulus questions in long format, with a row for
+        each answer. Injection questions are left out and only the first
+        answer to a question in a repetition is kept. Data of the object is
+        not modified.
+
+        Returns:
+            dataframe: answers with columns worker, stimulus, rep, question
+                       and answer.
+        """
+        columns = ['worker', 'stimulus', 'rep', 'question', 'answer']
+        # collect answers and questions of all stimuli and repetitions
+        pieces = []
+        for num in range(self.num_stimuli):
+            for rep in range(self.num_repeat):
+                video_id = 'video_' + str(num)
+                pos_as = self.columns_index.get((video_id, 'as', rep))
+                pos_order = self.columns_index.get((video_id, 'qs', rep))
+                if pos_as is None or pos_order is None:
+                    continue
+                pieces.append(pd.DataFrame({
+                    'worker': self.heroku_data.index,
+                    'stimulus': num,
+                    'rep': rep,
+                    'question': self.heroku_data.iloc[:, pos_order].values,
+                    'answer': self.heroku_data.iloc[:, pos_as].values}))
+        if not pieces:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat(pieces, ignore_index=True)
+        # filter out empty values
+        is_list = (df['answer'].map(type) == list) & \
+            (df['question'].map(type) == list)
+        df = df[is_list]
+        # each question needs an answer
+        matched = df['question'].str.len() == df['answer'].str.len()
+        if not matched.all():
+            logger.warning('Ignoring {} repetitions with different number '
+                           + 'of questions and answers.', (~matched).sum())
+            df = df[matched]
+        # row for each answer, lists in source data are not changed. columns
+        # are exploded one by one, explode of many columns needs pandas 1.3
+        answers = df['answer'].explode().values
+        df = df.drop(columns='answer').explode('question')
+        df['answer'] = answers
+        # delete injection
+        df = df[df['question'] != 'injection']
+        # first answer to each question
+        df = df.drop_duplicates(['worker', 'stimulus', 'rep', 'question'])
+        return df[columns].reset_index(drop=True)
+
+    @cs.instrument.stage('heroku.process_stimulus_questions')
     def process_stimulus_questions(self, questions):
         """Process questions that follow each stimulus.
 
@@ -520,99 +797,47 @@ class Heroku:
             dataframe: updated mapping dataframe.
         """
         logger.info('Processing post-stimulus questions')
-        # array in which arrays of video_as data is stored
-        mapping_as = []
-        # loop through all stimuli
-        for num in tqdm(range(self.num_stimuli)):
-            # calculate length of of array with answers
-            length = 0
-            for q in questions:
-                # 1 column required for numeric data
-                # numberic answer, create 1 column to store mean value
-                if q['type'] == 'num':
-                    length = length + 1
-                # strings as answers, create columns to store counts
-                elif q['type'] == 'str':
-                    length = length + len(q['options'])
-                else:
-                    logger.error('Wrong type of data {} in question {}' +
-                                 'provided.', q['type'], q['question'])
-                    return -1
-            # array in which data of a single stimulus is stored
-            answers = [[[] for i in range(self.heroku_data.shape[0])]
-                       for i in range(len(questions))]
-            # for number of repetitions in survey, add extra number
-            for rep in range(self.num_repeat):
-                # add suffix with repetition ID
-                video_as = 'video_' + str(num) + '-as-' + str(rep)
-                video_order = 'video_' + str(num) + '-qs-' + str(rep)
-                # loop over columns
-                for col_name, col_data in self.heroku_data.iteritems():
-                    # when col_name equals video, then check
-                    if col_name == video_as:
-                        # loop over rows in column
-                        for pp, row in enumerate(col_data):
-                            # filter out empty values
-                            if type(row) == list:
-                                order = self.heroku_data.iloc[pp][video_order]  # noqa: E501
-                                # check if injection question is present
-                                if 'injection' in order:
-                                    # delete injection
-                                    del row[order.index('injection')]
-                                    del order[order.index('injection')]
-                                # loop through questions
-                                for i, q in enumerate(questions):
-                                    # extract answer
-                                    ans = row[order.index(q['question'])]
-                                    # store answer from repetition
-                                    answers[i][pp].append(ans)
-            # calculate mean answers from all repetitions for numeric questions
-            for i, q in enumerate(questions):
-                if q['type'] == 'num' and answers[i]:
-                    # convert to float
-                    answers[i] = [list(map(float, sublist))
-                                  for sublist in answers[i]]
-                    # calculate mean of mean of responses of each participant
-                    with warnings.catch_warnings():
-                        warnings.simplefilter('ignore',
-                                              category=RuntimeWarning)
-                        answers[i] = np.nanmean([np.nanmean(j)
-                                                 for j in answers[i]])
-            # save question data in array
-            mapping_as.append(answers)
+        # check types of questions
+        for q in questions:
+            if q['type'] not in ['num', 'str']:
+                logger.error('Wrong type of data {} in question {}' +
+                             'provided.', q['type'], q['question'])
+                return -1
+        # answers of all participants in long format
+        answers = self.get_answers_long()
+        stimuli = range(self.num_stimuli)
         # add column with data to current mapping file
-        for i, q in enumerate(questions):
+        for q in questions:
             # extract answers for the given question
-            q_ans = [item[i] for item in mapping_as]
-            # for numeric question, add column with mean values
+            q_ans = answers[answers['question'] == q['question']]
+            # for numeric question, add column with mean of mean of responses
+            # of each participant
             if q['type'] == 'num':
-                self.mapping[q['question']] = q_ans
+                values = pd.to_numeric(q_ans['answer'], errors='coerce')
+                means = values.groupby([q_ans['stimulus'],
+                                        q_ans['worker']]).mean()
+                means = means.groupby(level=0).mean()
+                self.mapping[q['question']] = means.reindex(stimuli).values
             # for textual question, add columns with counts of each value
             else:
-                # go over options and count answers with the option for each
-                # stimulus
+                counts = q_ans.groupby(['stimulus', 'answer']).size()
+                counts = counts.unstack(fill_value=0)
+                counts = counts.reindex(index=stimuli,
+                                        columns=q['options'],
+                                        fill_value=0).astype(int)
                 for option in q['options']:
-                    # store counts in list
-                    count_option = []
-                    # go over each answer
-                    for ans in q_ans:
-                        # flatten list of answers
-                        ans = [item for sublist in ans for item in sublist]
-                        # add count for answers for the given option
-                        count_option.append(ans.count(option))
                     # build name of column
                     col_name = q['question'] + '-' + option.replace(' ', '_')
                     col_name = col_name.lower()
                     # add to mapping
-                    self.mapping[col_name] = count_option
+                    self.mapping[col_name] = counts[option].values
         # save to csv
         if self.save_csv:
-            # save to csv
-            self.mapping.to_csv(cs.settings.output_dir + '/' +
-                                self.file_mapping_csv + '.csv')
+            self.save_mapping_csv()
         # return new mapping
         return self.mapping
 
+    @cs.instrument.stage('heroku.filter_data')
     def filter_data(self, df):
         """
         Filter data based on the folllowing criteria:
@@ -634,42 +859,36 @@ class Heroku:
         # 1. People who made mistakes in injected questions
         logger.info('Filter-h1. People who had too many stimuli of unexpected'
                     + ' length.')
-        # df to store data to filter out
-        df_1 = pd.DataFrame()
-        # array to store in video names
-        video_dur = []
-        for i in range(0, self.num_stimuli):
-            for rep in range(0, self.num_repeat):
-                video_dur.append('video_' + str(i) + '-dur-' + str(rep))
-        # tqdm adds progress bar
-        # loop over participants in data
-        for index, row in tqdm(df.iterrows(), total=df.shape[0]):
-            data_count = 0
-            counter_filtered = 0
-            for i in range(self.num_stimuli):
-                for rep in range(self.num_repeat):
-                    # add suffix with repetition ID
-                    video_dur = 'video_' + str(i) + '-dur-' + str(rep)
-                    # check id value is present
-                    if video_dur not in row.keys():
-                        continue
-                    # check for nan values
-                    if pd.isna(row[video_dur]):
-                        continue
-                    else:
-                        # up data count when data is found
-                        data_count = data_count + 1
-                        if (row[video_dur] < (self.mapping['min_dur'].iloc[i])  # noqa: E501
-                           or row[video_dur] > (self.mapping['max_dur'].iloc[i])):  # noqa: E501
-                            # up counter if data with wrong length is found
-                            counter_filtered = counter_filtered + 1
-            # Only check for participants that watched all videos
-            if data_count >= self.num_stimuli_participant * self.num_repeat:
-                # check threshold ratio
-                if counter_filtered / data_count > self.allowed_length:
-                    # if threshold reached, append data of this participant to
-                    # df_1
-                    df_1 = df_1.append(row)
+        # index of columns
+        columns_index = self.parse_columns(df.columns)
+        # positions of columns with durations and expected limits
+        positions = []
+        min_dur = []
+        max_dur = []
+        for i in range(self.num_stimuli):
+            for rep in range(self.num_repeat):
+                pos = columns_index.get(('video_' + str(i), 'dur', rep))
+                # check id value is present
+                if pos is None:
+                    continue
+                positions.append(pos)
+                min_dur.append(self.mapping['min_dur'].iloc[i])
+                max_dur.append(self.mapping['max_dur'].iloc[i])
+        durs = df.iloc[:, positions].astype(float).values
+        # data count for each participant, nan values are skipped
+        present = ~np.isnan(durs)
+        data_count = present.sum(axis=1)
+        # stimuli with wrong length for each participant
+        with np.errstate(invalid='ignore'):
+            wrong = present & ((durs < np.array(min_dur, dtype=float))
+                               | (durs > np.array(max_dur, dtype=float)))
+        counter_filtered = wrong.sum(axis=1)
+        # only check for participants that watched all videos and check
+        # threshold ratio
+        watched = data_count >= self.num_stimuli_participant * self.num_repeat
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = counter_filtered / data_count
+        df_1 = df[watched & (ratio > self.allowed_length)]
         logger.info('Filter-h1. People who had more than {} share of stimuli'
                     + ' of unexpected length: {}.',
                     allowed_stimuli,
@@ -684,8 +903,10 @@ class Heroku:
         # df to store data to filter out
         df_2 = pd.DataFrame()
         # loop over rows in data
-        # tqdm adds progress bar
-        for index, row in tqdm(df.iterrows(), total=df.shape[0]):
+        progress = cs.progress.Progress('heroku.filter_data',
+                                        total=df.shape[0],
+                                        unit='rows')
+        for index, row in progress.wrap(df.iterrows()):
             # fill nans with empty lists
             empty = pd.Series([[] for _ in range(len(row.index))],
                               index=row.index)
@@ -694,61 +915,58 @@ class Heroku:
             mistakes_counter = 0
             # counter sentinel images found in training
             injections_counter = 0
-            # questions detected
-            questions = []
-            # answers detected
-            answers = []
-            # loop over values in the row
-            for index_r, value_r in row.iteritems():
+            # loop over stimuli and repetitions with injected questions
+            for (stimulus, field, rep), pos in columns_index.items():
+                if field != 'qi':
+                    continue
+                value_r = row.iloc[pos]
                 # check if input is given
                 if (value_r == []):
                     # if no data present, move to the next cell
                     continue
-                # questions detected
-                if '-qs' in index_r:
-                    questions = value_r
-                # answers detected
-                if '-as' in index_r:
-                    answers = value_r
-                # injected question
-                if '-qi' in index_r:
-                    # there can be multiple injections per stimulus
-                    for question in value_r:
-                        # counter of processed questions
-                        processed_counter = 0
-                        # check if it indeed an injection
-                        if question != 'na':
-                            # increase counter of injections
-                            injections_counter = injections_counter + 1
-                            # correct answer
-                            try:
-                                index = injections.index(question)
-                            except ValueError:
-                                logger.debug('Detected unexpected injection'
-                                             + 'question {} for {}.',
-                                             question,
-                                             row['worker_code'])
-                                continue
-                            correct_answer = injections_answers[index]
-                            # given answer (multiple possible)
-                            indices = [i for i, x in enumerate(questions) if x == "injection"]  # noqa: E501
-                            index = indices[processed_counter]
-                            given_answer = answers[index]
-                            # increase counter of processed questions
-                            processed_counter = processed_counter + 1
-                            if given_answer != correct_answer:
-                                # mistake found
-                                mistakes_counter = mistakes_counter + 1
-                                # check if limit was reached
-                                if mistakes_counter > allowed_mistakes:
-                                    logger.debug('{}: found {} mistakes for '
-                                                 + 'question injections.',
-                                                 row['worker_code'],
-                                                 mistakes_counter)
-                                    # add to df with data to filter out
-                                    if row['worker_code'] not in df_2.index:
-                                        df_2 = df_2.append(row)
-                                    break
+                # questions and answers of the same stimulus and repetition
+                pos_qs = columns_index.get((stimulus, 'qs', rep))
+                pos_as = columns_index.get((stimulus, 'as', rep))
+                questions = row.iloc[pos_qs] if pos_qs is not None else []
+                answers = row.iloc[pos_as] if pos_as is not None else []
+                # injected question, there can be multiple injections per
+                # stimulus
+                for question in value_r:
+                    # counter of processed questions
+                    processed_counter = 0
+                    # check if it indeed an injection
+                    if question != 'na':
+                        # increase counter of injections
+                        injections_counter = injections_counter + 1
+                        # correct answer
+                        try:
+                            index = injections.index(question)
+                        except ValueError:
+                            logger.debug('Detected unexpected injection'
+                                         + 'question {} for {}.',
+                                         question,
+                                         row['worker_code'])
+                            continue
+                        correct_answer = injections_answers[index]
+                        # given answer (multiple possible)
+                        indices = [i for i, x in enumerate(questions) if x == "injection"]  # noqa: E501
+                        index = indices[processed_counter]
+                        given_answer = answers[index]
+                        # increase counter of processed questions
+                        processed_counter = processed_counter + 1
+                        if given_answer != correct_answer:
+                            # mistake found
+                            mistakes_counter = mistakes_counter + 1
+                            # check if limit was reached
+                            if mistakes_counter > allowed_mistakes:
+                                logger.debug('{}: found {} mistakes for '
+                                             + 'question injections.',
+                                             row['worker_code'],
+                                             mistakes_counter)
+                                # add to df with data to filter out
+                                if row['worker_code'] not in df_2.index:
+                                    df_2 = df_2.append(row)
+                                break
         logger.info('Filter-h2. People who made more than {} mistakes with '
                     + 'injected questions: {}',
                     allowed_mistakes,
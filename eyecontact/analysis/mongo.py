@@ -0,0 +1,245 @@
+# by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
+"""Streaming readers of MongoDB exports of experiment entries.
+
+The server stores each POST to /experiment-data as an Entry document
+{"_id": ObjectId, "data": [cells of jsPsych], "__v": 0}. Entries can be read
+from files of mongoexport (JSON lines, relaxed or canonical extended JSON) and
+of mongodump (.bson, concatenated BSON documents) one document at a time,
+without a connection to a database. Files with a {"data": [...]} object per
+line, as used before, are read as JSON lines. All of them can be compressed,
+see eyecontact.compression.
+
+Examples
+--------
+>>> for cells, size in read_entries('entries.bson'):
+...     print(len(cells), size)
+"""
+import datetime as dt
+import decimal
+import json
+import struct
+
+import eyecontact as cs
+
+logger = cs.CustomLogger(__name__)  # use custom logger
+
+# extensions of files read as BSON
+extensions_bson = ['.bson']
+# start of unix time for BSON dates
+epoch = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+# readers of numbers in BSON
+_int32 = struct.Struct('<i').unpack_from
+_int64 = struct.Struct('<q').unpack_from
+_uint64 = struct.Struct('<Q').unpack_from
+_double = struct.Struct('<d').unpack_from
+
+
+def _extended_json(obj):
+    """Convert values of MongoDB extended JSON, such as {"$oid": "..."} or
+    {"$numberLong": "..."}, to Python values. Used as object_hook of
+    json.loads.
+
+    Args:
+        obj (dict): decoded JSON object.
+
+    Returns:
+        object: converted value or obj.
+    """
+    if len(obj) != 1:
+        return obj
+    key, value = next(iter(obj.items()))
+    if key == '$oid':
+        return value
+    if key in ('$numberInt', '$numberLong'):
+        return int(value)
+    if key == '$numberDouble':
+        return float(value)
+    if key == '$numberDecimal':
+        return decimal.Decimal(value)
+    if key == '$date':
+        if isinstance(value, str):
+            return dt.datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return epoch + dt.timedelta(milliseconds=int(value))
+    return obj
+
+
+def _read_cstring(buf, pos):
+    """Null-terminated string in BSON.
+
+    Returns:
+        str, int: string and position after it.
+    """
+    end = buf.index(b'\x00', pos)
+    return buf[pos:end].decode('utf-8'), end + 1
+
+
+def _read_string(buf, pos):
+    """String with length in BSON.
+
+    Returns:
+        str, int: string and position after it.
+    """
+    length = _int32(buf, pos)[0]
+    pos += 4
+    return buf[pos:pos + length - 1].decode('utf-8'), pos + length
+
+
+def _read_document(buf, pos, array=False):
+    """Decode BSON document (or array) starting at pos.
+
+    Args:
+        buf (bytes): data.
+        pos (int): position of document.
+        array (bool, optional): decode as list.
+
+    Returns:
+        dict or list, int: document and position after it.
+    """
+    length = _int32(buf, pos)[0]
+    end = pos + length - 1
+    pos += 4
+    doc = [] if array else {}
+    while pos < end:
+        kind = buf[pos]
+        # names of items of arrays are their indices
+        if array:
+            pos = buf.index(b'\x00', pos + 1) + 1
+        else:
+            name, pos = _read_cstring(buf, pos + 1)
+        if kind == 0x01:  # double
+            value = _double(buf, pos)[0]
+            pos += 8
+        elif kind in (0x02, 0x0D, 0x0E):  # string, code, symbol
+            value, pos = _read_string(buf, pos)
+        elif kind in (0x03, 0x04):  # document, array
+            value, pos = _read_document(buf, pos, array=kind == 0x04)
+        elif kind == 0x05:  # binary
+            size = _int32(buf, pos)[0]
+            value = bytes(buf[pos + 5:pos + 5 + size])
+            pos += 5 + size
+        elif kind == 0x07:  # ObjectId
+            value = bytes(buf[pos:pos + 12]).hex()
+            pos += 12
+        elif kind == 0x08:  # boolean
+            value = buf[pos] != 0
+            pos += 1
+        elif kind == 0x09:  # UTC datetime
+            ms = _int64(buf, pos)[0]
+            value = epoch + dt.timedelta(milliseconds=ms)
+            pos += 8
+        elif kind in (0x06, 0x0A, 0x7F, 0xFF):  # undefined, null, max, min
+            value = None
+        elif kind == 0x0B:  # regular expression
+            pattern, pos = _read_cstring(buf, pos)
+            _, pos = _read_cstring(buf, pos)
+            value = pattern
+        elif kind == 0x0C:  # DBPointer
+            value, pos = _read_string(buf, pos)
+            pos += 12
+        elif kind == 0x0F:  # code with scope
+            size = _int32(buf, pos)[0]
+            value, _ = _read_string(buf, pos + 4)
+            pos += size
+        elif kind == 0x10:  # int32
+            value = _int32(buf, pos)[0]
+            pos += 4
+        elif kind in (0x11, 0x12):  # timestamp, int64
+            value = (_uint64 if kind == 0x11 else _int64)(buf, pos)[0]
+            pos += 8
+        elif kind == 0x13:  # decimal128, kept as raw bytes
+            value = bytes(buf[pos:pos + 16])
+            pos += 16
+        else:
+            raise ValueError('Unknown BSON type {} at position {}.'.format(
+                hex(kind), pos))
+        if array:
+            doc.append(value)
+        else:
+            doc[name] = value
+    return doc, end + 1
+
+
+def decode_bson(buf):
+    """Decode a single BSON document.
+
+    Args:
+        buf (bytes): encoded document.
+
+    Returns:
+        dict: document.
+    """
+    return _read_document(buf, 0)[0]
+
+
+def read_bson(f):
+    """Documents of a mongodump .bson file, one at a time.
+
+    Args:
+        f (file): file opened in binary mode.
+
+    Yields:
+        dict, int: document and its size in bytes.
+    """
+    while True:
+        head = f.read(4)
+        if not head:
+            return
+        if len(head) < 4:
+            raise ValueError('Truncated BSON document.')
+        length = struct.unpack('<i', head)[0]
+        body = f.read(length - 4)
+        if len(body) < length - 4:
+            raise ValueError('Truncated BSON document.')
+        yield decode_bson(head + body), length
+
+
+def read_jsonl(f):
+    """Documents of a mongoexport file with a JSON document per line, one at
+    a time. Extended JSON values are converted to Python values.
+
+    Args:
+        f (file): file opened in binary mode.
+
+    Yields:
+        dict, int: document and size of its line in bytes.
+    """
+    for line in f:
+        if not line.strip():
+            continue
+        yield json.loads(line, object_hook=_extended_json), len(line)
+
+
+def unwrap(doc):
+    """Cells of jsPsych in an entry, taken out of its data envelope.
+
+    Args:
+        doc (dict or list): entry.
+
+    Returns:
+        list: cells.
+    """
+    data = doc['data'] if isinstance(doc, dict) and 'data' in doc else doc
+    # body saved as a string
+    if isinstance(data, str):
+        data = json.loads(data)
+    return data
+
+
+def read_entries(file):
+    """Cells of entries in a file, one entry at a time. Files with extensions
+    in extensions_bson are read as BSON, others as JSON lines. Compressed
+    files are decompressed while they are read.
+
+    Args:
+        file (str): path to file.
+
+    Yields:
+        list, int: cells of entry and size of entry in bytes.
+    """
+    reader = read_jsonl
+    name = cs.compression.strip_extension(file).lower()
+    if any(name.endswith(ext) for ext in extensions_bson):
+        reader = read_bson
+    with cs.compression.open_file(file) as f:
+        for doc, size in reader(f):
+            yield unwrap(doc), size
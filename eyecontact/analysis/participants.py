@@ -0,0 +1,135 @@
+# by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
+import numpy as np
+import pandas as pd
+
+import eyecontact as cs
+
+logger = cs.CustomLogger(__name__)  # use custom logger
+
+
+class Participants:
+    """Registry of participants present in all sources of data. Keeps a sorted
+    index of worker codes shared by all frames added to it, and gives each
+    frame aligned to that index. Rows of a frame are copied only once, when
+    its aligned version is requested, instead of merging all frames into one
+    and splitting them again.
+
+    Examples
+    --------
+    >>> participants = Participants()
+    >>> participants.add('heroku', heroku_data)
+    >>> participants.add('appen', appen_data)
+    >>> participants.exclude(cheaters)
+    >>> heroku_data = participants.get('heroku')
+    """
+
+    def __init__(self, key='worker_code'):
+        # column or index with codes of participants
+        self.key = key
+        # frames added to registry
+        self.frames = {}
+        # codes of participants excluded from analysis
+        self.excluded = pd.Index([])
+        # shared sorted index, built when needed
+        self._index = None
+        # mask of included participants, built when needed
+        self._included = None
+        # aligned frames
+        self._aligned = {}
+
+    def __len__(self):
+        """Number of included participants."""
+        return int(self.included.sum())
+
+    def add(self, name, df):
+        """Add frame to registry. Participants not in the frame are dropped
+        from the shared index.
+
+        Args:
+            name (str): name of frame.
+            df (dataframe): data with codes of participants in column or index
+                            self.key.
+        """
+        self.frames[name] = df
+        self._index = None
+        self._included = None
+        self._aligned = {}
+
+    def exclude(self, codes):
+        """Exclude participants from frames given by get.
+
+        Args:
+            codes (list): codes of participants.
+        """
+        self.excluded = self.excluded.append(pd.Index(codes))
+        self._included = None
+        self._aligned = {}
+
+    def get_codes(self, df):
+        """Codes of participants in frame, taken from column self.key or from
+        the index, if it has that name.
+
+        Args:
+            df (dataframe): data.
+
+        Returns:
+            index: codes of participants in order of rows.
+        """
+        if self.key in df.columns:
+            return pd.Index(df[self.key])
+        if df.index.name == self.key:
+            return df.index
+        raise KeyError('Column or index {} not found.'.format(self.key))
+
+    @property
+    def index(self):
+        """Sorted codes of participants present in all frames."""
+        if self._index is None:
+            codes = None
+            for df in self.frames.values():
+                frame_codes = self.get_codes(df).dropna().unique()
+                if codes is None:
+                    codes = pd.Index(frame_codes)
+                else:
+                    codes = codes.intersection(frame_codes)
+            if codes is None:
+                codes = pd.Index([])
+            self._index = pd.Index(np.sort(codes.values), name=self.key)
+        return self._index
+
+    @property
+    def included(self):
+        """Mask of included participants in index."""
+        if self._included is None:
+            self._included = ~self.index.isin(self.excluded)
+        return self._included
+
+    def get(self, name):
+        """Frame aligned to included participants, with codes of participants
+        as sorted index. Only the first row of each participant is used.
+
+        Args:
+            name (str): name of frame.
+
+        Returns:
+            dataframe: aligned frame.
+        """
+        if name not in self._aligned:
+            df = self.frames[name]
+            codes = self.get_codes(df)
+            # first row of each participant
+            first = ~codes.duplicated(keep='first')
+            if not first.all():
+                logger.warning('Found {} duplicate rows of participants in '
+                               + '{}, using first rows.',
+                               (~first).sum(),
+                               name)
+            index = self.index[self.included]
+            rows = np.flatnonzero(first)[
+                codes[first].get_indexer(index)]
+            # column with codes is replaced by index
+            columns = np.flatnonzero(df.columns != self.key)
+            aligned = df.iloc[rows, columns]
+            aligned.index = index
+            self._aligned[name] = aligned
+        return self._aligned[name]
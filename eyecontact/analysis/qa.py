@@ -1,7 +1,6 @@
 # by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
 import requests
 import pandas as pd
-from tqdm import tqdm
 
 import eyecontact as cs
 
@@ -18,6 +17,7 @@ class QA:
         # appen job ID
         self.job_id = job_id
 
+    @cs.instrument.stage('qa.flag_users')
     def flag_users(self):
         """
         Flag users descibed in csv file self.file_cheaters from job
@@ -32,7 +32,10 @@ class QA:
         # count flagged users
         flagged_counter = 0
         # loop over users in the job for flagging
-        for index, row in tqdm(df.iterrows(), total=df.shape[0]):
+        progress = cs.progress.Progress('qa.flag_users',
+                                        total=df.shape[0],
+                                        unit='requests')
+        for index, row in progress.wrap(df.iterrows()):
             # make a PUT request for flagging
             cmd_put = 'https://api.appen.com/v1/jobs/' + \
                       str(self.job_id) + \
@@ -72,6 +75,7 @@ class QA:
                     + 'previously).',
                     str(flagged_counter))
 
+    @cs.instrument.stage('qa.reject_users')
     def reject_users(self):
         """
         Reject users descibed in csv file self.file_cheaters from job
@@ -86,7 +90,10 @@ class QA:
         # count rejected users
         rejected_counter = 0
         # loop over users in the job for rejecting
-        for index, row in tqdm(df.iterrows(), total=df.shape[0]):
+        progress = cs.progress.Progress('qa.reject_users',
+                                        total=df.shape[0],
+                                        unit='requests')
+        for index, row in progress.wrap(df.iterrows()):
             # make a PUT request for rejecting
             cmd_put = 'https://api.appen.com/v1/jobs/' + \
                       str(self.job_id) + \
@@ -0,0 +1,96 @@
+# by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
+"""Resolution of stimuli in heroku data to integer IDs.
+
+Cells of jsPsych name stimuli by paths of files, such as
+'../public/videos/video_3.mp4' or a list of such paths. A resolver is built
+once from the prefixes of stimuli and the mapping of stimuli and parses each
+distinct path only once. Stimuli get the IDs of their rows in the mapping, and
+stimuli not in the mapping get next free IDs. Names of stimuli (e.g.,
+'video_3') are kept for columns and tables of results.
+
+Examples
+--------
+>>> resolver = StimulusResolver({'stimulus': 'video_'}, mapping)
+>>> resolver.resolve('../public/videos/video_3.mp4')
+3
+>>> resolver.names[3]
+'video_3'
+"""
+import os
+
+import eyecontact as cs
+
+logger = cs.CustomLogger(__name__)  # use custom logger
+
+
+class StimulusResolver:
+    """Memoized mapping of paths of stimuli to integer IDs."""
+
+    def __init__(self, prefixes, mapping):
+        """
+        Args:
+            prefixes (dict): prefixes of files with stimuli, with the prefix of
+                             videos under key 'stimulus'.
+            mapping (dataframe): mapping of stimuli, with names of stimuli in
+                                 column or index video_id.
+        """
+        self.prefix = prefixes['stimulus']
+        if 'video_id' in mapping.columns:
+            names = mapping['video_id']
+        else:
+            names = mapping.index
+        # names of stimuli by ID
+        self.names = [str(name) for name in names]
+        # IDs by names of stimuli
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        # IDs of parsed paths, None for paths without stimuli
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def parse(self, path):
+        """
+        Name of stimulus in path of file, without folders and extension.
+
+        Args:
+            path (str): path of file.
+
+        Returns:
+            str: name of stimulus, None if it is not a stimulus, e.g. an
+                 image in instructions.
+        """
+        name = os.path.splitext(path.rsplit('/', 1)[-1])[0]
+        if self.prefix not in name:
+            return None
+        return name
+
+    def resolve(self, stimulus):
+        """
+        ID of stimulus of cell.
+
+        Args:
+            stimulus (str or list): path of file, or list of paths of which
+                                    the first one is used.
+
+        Returns:
+            int: ID of stimulus, None if it is not a stimulus.
+        """
+        # list of stimuli. use 1st
+        path = stimulus[0] if isinstance(stimulus, list) else stimulus
+        try:
+            return self.cache[path]
+        except KeyError:
+            pass
+        name = self.parse(path)
+        stim_id = None
+        if name is not None:
+            stim_id = self.ids.get(name)
+            # stimulus not in mapping gets a new ID
+            if stim_id is None:
+                logger.debug('Stimulus {} is not in mapping.', name)
+                stim_id = len(self.names)
+                self.names.append(name)
+                self.ids[name] = stim_id
+        self.cache[path] = stim_id
+        return stim_id
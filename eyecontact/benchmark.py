@@ -0,0 +1,357 @@
+# by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
+"""Benchmark of the pipeline on synthetic data.
+
+Runs stages of processing and a set of figures on data of growing numbers of
+participants generated by eyecontact.synthetic, and records wall time and
+peak resident memory of each stage. Each number of participants runs in a
+separate process, so that memory of one run does not affect the next one.
+Results are compared to a baseline and stages that became slower or use more
+memory than allowed by the threshold are reported as regressions.
+
+Example:
+    python -m eyecontact.benchmark --participants 1000 10000 100000
+    python -m eyecontact.benchmark --participants 1000 --save-baseline
+    python -m eyecontact.benchmark --logging
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+import eyecontact as cs
+from eyecontact import synthetic
+
+logger = cs.CustomLogger(__name__)  # use custom logger
+
+# numbers of participants
+participants = [1000, 10000, 100000]
+# file with baseline
+file_baseline = os.path.join(cs.settings.root_dir, 'benchmark_baseline.json')
+# file with results of the last run
+file_results = 'benchmark.json'
+# file with scaling of stages with numbers of participants
+file_scaling = 'benchmark_scaling.csv'
+# folder with synthetic data and output of benchmarked figures
+folder = os.path.join(cs.settings.cache_dir, 'benchmark')
+# seed of synthetic data
+seed = 42
+# allowed relative increase of time and memory before a regression is flagged
+threshold = 0.2
+# differences below these values are noise, s and MB
+min_diff_time = 0.05
+min_diff_rss = 5
+# interval of sampling of memory, s
+interval_rss = 0.01
+
+
+def measure(results, stage, num_participants, func, *args, **kwargs):
+    """Call function and append its wall time and peak memory to results.
+    Memory is sampled in a thread while the function runs.
+
+    Args:
+        results (list): results of stages.
+        stage (str): name of stage.
+        num_participants (int): number of participants in data.
+        func (callable): stage.
+        *args: arguments of stage.
+        **kwargs: keyword arguments of stage.
+
+    Returns:
+        object: output of function.
+    """
+    sampler = cs.instrument.RssSampler(interval_rss).start()
+    rss_start = sampler.peak
+    start = time.perf_counter()
+    try:
+        output = func(*args, **kwargs)
+    finally:
+        duration = time.perf_counter() - start
+        rss_peak = sampler.stop()
+    results.append({'stage': stage,
+                    'participants': num_participants,
+                    'time': duration,
+                    'rss_peak': rss_peak,
+                    'rss_delta': rss_peak - rss_start})
+    logger.info('Benchmark {} with {} participants: {:.3f} s, peak memory '
+                + '{:.1f} MB (+{:.1f} MB).',
+                stage,
+                num_participants,
+                duration,
+                rss_peak,
+                rss_peak - rss_start)
+    return output
+
+
+def get_data(num_participants):
+    """Synthetic data of participants, generated once and reused by later
+    runs.
+
+    Args:
+        num_participants (int): number of participants.
+
+    Returns:
+        dict: paths to files with heroku data, appen data and mapping.
+    """
+    out_dir = os.path.join(folder, str(num_participants))
+    paths = {name: os.path.join(out_dir, file)
+             for name, file in [('heroku', synthetic.file_heroku),
+                                ('appen', synthetic.file_appen),
+                                ('mapping', synthetic.file_mapping)]}
+    if all(os.path.exists(path) for path in paths.values()):
+        return paths
+    return synthetic.generate(num_participants, out_dir, seed=seed)
+
+
+def run_stages(num_participants):
+    """Run stages of pipeline on synthetic data.
+
+    Args:
+        num_participants (int): number of participants.
+
+    Returns:
+        list: results of stages.
+    """
+    paths = get_data(num_participants)
+    # output of figures and csv files next to data
+    cs.settings.output_dir = os.path.join(folder,
+                                          str(num_participants),
+                                          'output')
+    os.makedirs(cs.settings.output_dir, exist_ok=True)
+    results = []
+    n = num_participants
+    # heroku data
+    heroku = cs.analysis.Heroku(files_data=[paths['heroku']],
+                                save_p=False,
+                                load_p=False,
+                                save_csv=False)
+    # mapping of stimuli of synthetic data, used to resolve stimuli while
+    # reading data
+    heroku.mapping = pd.read_csv(paths['mapping']).set_index('video_id')
+    heroku_data = measure(results, 'heroku.read_data', n,
+                          heroku.read_data, filter_data=False)
+    heroku_data = measure(results, 'heroku.filter_data', n,
+                          heroku.filter_data, heroku_data)
+    heroku.set_data(heroku_data)
+    # appen data
+    appen = cs.analysis.Appen(file_data=paths['appen'],
+                              save_p=False,
+                              load_p=False,
+                              save_csv=False)
+    appen_data = measure(results, 'appen.read_data', n, appen.read_data)
+    # masking on its own, masked values are masked again
+    df = appen_data.copy()
+    df['worker_id'] = pd.to_numeric(df['worker_id'])
+    measure(results, 'appen.mask_ips_ids', n, appen.mask_ips_ids, df)
+    countries_data = measure(results, 'appen.process_countries', n,
+                             appen.process_countries)
+    mapping = measure(results, 'heroku.process_kp', n, heroku.process_kp)
+    questions = [{'question': 'eye_contact', 'type': 'num'},
+                 {'question': 'intuitive', 'type': 'num'}]
+    mapping = measure(results, 'heroku.process_stimulus_questions', n,
+                      heroku.process_stimulus_questions, questions)
+    # figures
+    analysis = cs.analysis.Analysis(output_mode='html',
+                                    force_refresh=True,
+                                    headless=True)
+    columns_drop = ['no', 'scenario', 'speed', 'video_length', 'kp',
+                    'kp_pp', 'min_dur', 'max_dur']
+    measure(results, 'analysis.plot_kp', n,
+            analysis.plot_kp, mapping, conf_interval=0.95)
+    measure(results, 'analysis.plot_kp_video', n,
+            analysis.plot_kp_video, mapping, 'video_0', conf_interval=0.95)
+    measure(results, 'analysis.corr_matrix', n,
+            analysis.corr_matrix, mapping.fillna(-1),
+            columns_drop=columns_drop, save_file=True)
+    measure(results, 'analysis.scatter_matrix', n,
+            analysis.scatter_matrix, mapping.fillna(-1),
+            columns_drop=columns_drop, color='dur_ec',
+            diagonal_visible=False, save_file=True)
+    # columns as index, as in run.py
+    measure(results, 'analysis.hist', n,
+            analysis.hist, heroku_data,
+            x=heroku_data.columns[heroku.get_positions('dur')],
+            nbins=100, pretty_text=True, save_file=True)
+    measure(results, 'analysis.scatter', n,
+            analysis.scatter, heroku_data, x='window_width',
+            y='window_height', color='browser_name', save_file=True)
+    measure(results, 'analysis.heatmap', n,
+            analysis.heatmap, heroku_data, x='window_width',
+            y='window_height', save_file=True)
+    measure(results, 'analysis.map', n,
+            analysis.map, countries_data, color='counts', save_file=True)
+    return results
+
+
+def get_scaling(df):
+    """Scaling of stages with number of participants, as the exponent of a
+    power law fitted to time and memory (1 for linear growth).
+
+    Args:
+        df (dataframe): results of stages.
+
+    Returns:
+        dataframe: exponents of time and memory per stage.
+    """
+    rows = []
+    for stage, df_stage in df.groupby('stage', sort=False):
+        row = {'stage': stage}
+        x = np.log(df_stage['participants'].to_numpy(dtype=float))
+        for column in ['time', 'rss_delta']:
+            y = df_stage[column].to_numpy(dtype=float)
+            valid = y > 0
+            if np.unique(x[valid]).size > 1:
+                row[column] = np.polyfit(x[valid], np.log(y[valid]), 1)[0]
+            else:
+                row[column] = np.nan
+        rows.append(row)
+    return pd.DataFrame(rows, columns=['stage', 'time', 'rss_delta'])
+
+
+def compare(df, baseline, threshold=threshold):
+    """Compare results to baseline.
+
+    Args:
+        df (dataframe): results of stages.
+        baseline (dataframe): results of stages in baseline.
+        threshold (float, optional): allowed relative increase.
+
+    Returns:
+        dataframe: regressions with values of results and baseline.
+    """
+    df = df.merge(baseline,
+                  on=['stage', 'participants'],
+                  suffixes=('', '_baseline'))
+    slower = ((df['time'] > df['time_baseline'] * (1 + threshold))
+              & (df['time'] - df['time_baseline'] > min_diff_time))
+    larger = ((df['rss_delta'] > df['rss_delta_baseline'] * (1 + threshold))
+              & (df['rss_delta'] - df['rss_delta_baseline'] > min_diff_rss))
+    df['regression'] = np.select([slower & larger, slower, larger],
+                                 ['time+rss', 'time', 'rss'],
+                                 '')
+    return df[slower | larger]
+
+
+def run(participants=participants, save_baseline=False, threshold=threshold):
+    """Run benchmark for numbers of participants, save results and compare
+    them to baseline.
+
+    Args:
+        participants (list, optional): numbers of participants.
+        save_baseline (bool, optional): save results as new baseline.
+        threshold (float, optional): allowed relative increase of time and
+                                     memory.
+
+    Returns:
+        dataframe: regressions, empty if there are none.
+    """
+    results = []
+    for num_participants in participants:
+        logger.info('Running benchmark with {} participants.',
+                    num_participants)
+        # fresh process for each run
+        with ProcessPoolExecutor(max_workers=1,
+                                 **cs.logmod.worker_init()) as pool:
+            results.extend(pool.submit(run_stages, num_participants).result())
+    df = pd.DataFrame(results)
+    # save results
+    with open(os.path.join(cs.settings.output_dir, file_results), 'w') as f:
+        json.dump(results, f, indent=2)
+    scaling = get_scaling(df)
+    scaling.to_csv(os.path.join(cs.settings.output_dir, file_scaling),
+                   index=False)
+    for row in scaling.itertuples():
+        logger.info('Scaling of {}: time ~ n^{:.2f}, memory ~ n^{:.2f}.',
+                    row.stage,
+                    row.time,
+                    row.rss_delta)
+    # compare to baseline
+    regressions = pd.DataFrame()
+    if os.path.exists(file_baseline):
+        with open(file_baseline) as f:
+            baseline = pd.DataFrame(json.load(f))
+        regressions = compare(df, baseline, threshold)
+        for row in regressions.itertuples():
+            logger.warning('Regression of {} ({}) with {} participants: '
+                           + '{:.3f} s vs {:.3f} s, {:.1f} MB vs {:.1f} MB.',
+                           row.stage,
+                           row.regression,
+                           row.participants,
+                           row.time,
+                           row.time_baseline,
+                           row.rss_delta,
+                           row.rss_delta_baseline)
+        if regressions.empty:
+            logger.info('No regressions above {:.0%} compared to {}.',
+                        threshold,
+                        file_baseline)
+    else:
+        logger.info('Baseline {} not found.', file_baseline)
+    if save_baseline:
+        with open(file_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        logger.info('Saved baseline to {}.', file_baseline)
+    return regressions
+
+
+def run_logging(num_calls=100000):
+    """Overhead of suppressed debug messages, as logged for each cell of
+    heroku data in Heroku.read_data. Compares eager formatting of messages
+    in all enabled loggers with formatting gated by levels of handlers.
+
+    Args:
+        num_calls (int, optional): number of messages.
+
+    Returns:
+        dict: time per message in ns for eager and gated formatting.
+    """
+    logger_bench = cs.CustomLogger(__name__ + '.logging')
+    logging_logger = logger_bench.logger
+    responses = [{'key': 'f', 'rt': 1000.0 + i} for i in range(50)]
+
+    def log_eager(level, msg, *args):
+        # formatting before gating on levels of handlers
+        if logging_logger.isEnabledFor(level):
+            logging_logger._log(level, msg.format(*args), args=())
+
+    times = {}
+    for name, log in [('eager', log_eager), ('gated', logger_bench.log)]:
+        start = time.perf_counter()
+        for i in range(num_calls):
+            log(logging.DEBUG, 'Found stimulus {}.', 'video_' + str(i % 10))
+            log(logging.DEBUG, 'Found {} points in keypress data.',
+                len(responses))
+            log(logging.DEBUG, 'Found responses to questions {}.', responses)
+        times[name] = (time.perf_counter() - start) / num_calls / 3 * 1e9
+        logger.info('Suppressed debug message with {} formatting: {:.0f} '
+                    + 'ns per message.',
+                    name,
+                    times[name])
+    return times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark pipeline.')
+    parser.add_argument('--participants', type=int, nargs='+',
+                        default=participants,
+                        help='numbers of participants')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='save results as new baseline')
+    parser.add_argument('--threshold', type=float, default=threshold,
+                        help='allowed relative increase of time and memory')
+    parser.add_argument('--logging', action='store_true',
+                        help='only measure overhead of suppressed logging')
+    args = parser.parse_args()
+    cs.logs(show_level='info', show_color=True, queue=True)
+    if args.logging:
+        run_logging()
+        sys.exit(0)
+    regressions = run(args.participants,
+                      save_baseline=args.save_baseline,
+                      threshold=args.threshold)
+    # non-zero exit code for use in continuous integration
+    sys.exit(1 if not regressions.empty else 0)
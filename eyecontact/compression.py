@@ -0,0 +1,227 @@
+# by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
+"""Reading of compressed files without temporary files.
+
+Files are decompressed while they are read, based on their extension: .gz,
+.bz2, .xz (and .lzma) with the standard library and .zst with the optional
+package zstandard, listed in README. Files in the seekable zstd format, which
+ends with a seek table of independent frames, are decompressed frame by frame
+in a pool of threads, and shards of frames can be decompressed separately.
+
+Examples
+--------
+>>> with open_file('heroku_1.json.zst') as f:
+...     for line in f:
+...         pass
+"""
+import bz2
+import gzip
+import io
+import lzma
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import eyecontact as cs
+
+logger = cs.CustomLogger(__name__)  # use custom logger
+
+# extensions of compressed files
+extensions = ['.gz', '.bz2', '.xz', '.lzma', '.zst', '.zstd']
+# magic number of skippable frame with seek table
+magic_skippable = 0x184D2A5E
+# magic number in footer of seek table
+magic_seekable = 0x8F92EAB1
+# size of footer of seek table
+size_footer = 9
+# number of frames decompressed ahead of reading
+frames_ahead = 8
+
+
+def strip_extension(path):
+    """Path without extension of compression, e.g. to detect format of data
+    in a compressed file.
+
+    Args:
+        path (str): path to file.
+
+    Returns:
+        str: path without extension of compression.
+    """
+    root, ext = os.path.splitext(path)
+    return root if ext.lower() in extensions else path
+
+
+def _zstandard():
+    """Module zstandard, needed for .zst files.
+
+    Returns:
+        module: zstandard.
+    """
+    try:
+        import zstandard
+    except ImportError:
+        logger.error('Package zstandard is needed to read .zst files. '
+                     + 'Install it with pip install zstandard.')
+        raise
+    return zstandard
+
+
+def read_seek_table(f):
+    """Seek table of a file in the seekable zstd format.
+
+    Args:
+        f (file): file opened in binary mode.
+
+    Returns:
+        list: (offset, compressed size, decompressed size) of each frame, None
+              if there is no seek table.
+    """
+    f.seek(0, os.SEEK_END)
+    size = f.seek(0, os.SEEK_CUR)
+    if size < size_footer + 8:
+        return None
+    f.seek(size - size_footer)
+    num_frames, descriptor, magic = struct.unpack('<IBI', f.read(size_footer))
+    if magic != magic_seekable:
+        return None
+    # entries have a checksum if the highest bit of descriptor is set
+    size_entry = 12 if descriptor & 0x80 else 8
+    size_table = num_frames * size_entry
+    start = size - size_footer - size_table - 8
+    if start < 0:
+        return None
+    f.seek(start)
+    magic, size_frame = struct.unpack('<II', f.read(8))
+    if magic != magic_skippable or size_frame != size_table + size_footer:
+        return None
+    table = f.read(size_table)
+    frames = []
+    offset = 0
+    for i in range(num_frames):
+        compressed, decompressed = struct.unpack_from('<II', table,
+                                                      i * size_entry)
+        frames.append((offset, compressed, decompressed))
+        offset += compressed
+    return frames
+
+
+def decompress_frames(f, frames, start=0, stop=None):
+    """Decompress a shard of frames of a seekable zstd file.
+
+    Args:
+        f (file): file opened in binary mode.
+        frames (list): seek table from read_seek_table.
+        start (int, optional): first frame.
+        stop (int, optional): frame after last one. Defaults to last frame.
+
+    Returns:
+        bytes: decompressed data.
+    """
+    zstandard = _zstandard()
+    dctx = zstandard.ZstdDecompressor()
+    chunks = []
+    for offset, compressed, decompressed in frames[start:stop]:
+        f.seek(offset)
+        chunks.append(dctx.decompress(f.read(compressed),
+                                      max_output_size=decompressed))
+    return b''.join(chunks)
+
+
+class _FramesReader(io.RawIOBase):
+    """Raw stream of decompressed frames of a seekable zstd file. Frames are
+    decompressed in a pool of threads, a few frames ahead of reading.
+    """
+
+    def __init__(self, path, frames, n_threads=None):
+        self.path = path
+        self.frames = frames
+        self.pool = ThreadPoolExecutor(max_workers=n_threads)
+        self.chunks = self.iter_chunks()
+        # current decompressed frame and position in it
+        self.buffer = memoryview(b'')
+        self.pos = 0
+
+    def decompress(self, frame):
+        # each thread reads with its own file
+        with open(self.path, 'rb') as f:
+            return decompress_frames(f, [frame])
+
+    def iter_chunks(self):
+        pending = []
+        for frame in self.frames:
+            pending.append(self.pool.submit(self.decompress, frame))
+            if len(pending) > frames_ahead:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self.pos >= len(self.buffer):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.buffer = memoryview(chunk)
+            self.pos = 0
+        n = min(len(b), len(self.buffer) - self.pos)
+        b[:n] = self.buffer[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.chunks.close()
+            self.pool.shutdown(wait=True)
+        super().close()
+
+
+def _open_zstd(path):
+    """Binary stream of decompressed .zst file.
+
+    Args:
+        path (str): path to file.
+
+    Returns:
+        file: stream.
+    """
+    zstandard = _zstandard()
+    with open(path, 'rb') as f:
+        frames = read_seek_table(f)
+    if frames:
+        logger.debug('Reading {} seekable frames of {} in parallel.',
+                     len(frames),
+                     path)
+        return io.BufferedReader(_FramesReader(path, frames))
+    reader = zstandard.ZstdDecompressor().stream_reader(
+        open(path, 'rb'), read_across_frames=True, closefd=True)
+    return io.BufferedReader(reader)
+
+
+def open_file(path, mode='rb', encoding='utf-8'):
+    """Open file for reading, decompressing it while it is read if it has an
+    extension of compression.
+
+    Args:
+        path (str): path to file.
+        mode (str, optional): 'rb' for binary or 'rt' for text.
+        encoding (str, optional): encoding in text mode.
+
+    Returns:
+        file: file object.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.gz':
+        f = gzip.open(path, 'rb')
+    elif ext == '.bz2':
+        f = bz2.open(path, 'rb')
+    elif ext in ('.xz', '.lzma'):
+        f = lzma.open(path, 'rb')
+    elif ext in ('.zst', '.zstd'):
+        f = _open_zstd(path)
+    else:
+        f = open(path, 'rb')
+    if mode == 'rt':
+        return io.TextIOWrapper(f, encoding=encoding)
+    return f
@@ -0,0 +1,306 @@
+# by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
+"""Timing and memory of stages of processing.
+
+Stages are marked with the stage context manager or decorator. Each stage
+records wall time, CPU time of the process, peak resident memory and, if
+tracemalloc is enabled, change and peak of memory allocated by Python. The
+peak of allocations needs tracemalloc.reset_peak of Python 3.9 and is left
+empty on older versions of Python. Stages can be nested. Records are kept in
+memory and written by save_report.
+
+Environment variables:
+    EYECONTACT_PROFILE: 'cprofile' or 'pyinstrument' to save a profile of
+        each stage that does not run inside another profiled stage.
+    EYECONTACT_TRACEMALLOC: '1' to trace allocations of Python, which makes
+        code noticeably slower.
+
+Examples
+--------
+>>> @stage('heroku.read_data')
+... def read_data(self):
+...     ...
+>>> with stage('figures'):
+...     ...
+>>> save_report()
+"""
+import cProfile
+import datetime as dt
+import functools
+import json
+import os
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import pandas as pd
+
+import eyecontact as cs
+
+logger = cs.CustomLogger(__name__)  # use custom logger
+
+# environment variable with profiler of stages
+env_profile = 'EYECONTACT_PROFILE'
+# environment variable enabling tracemalloc
+env_tracemalloc = 'EYECONTACT_TRACEMALLOC'
+# file with report of stages, saved as json and csv
+file_report = 'metrics'
+# folder with profiles of stages
+folder_profiles = 'profiles'
+# interval of sampling of memory, s
+interval_rss = 0.01
+# columns of report
+columns = ['stage', 'parent', 'depth', 'start', 'wall', 'cpu', 'rss_start',
+           'rss_peak', 'rss_delta', 'py_delta', 'py_peak', 'error']
+# records of finished stages
+records = []
+# running stages, innermost last
+_stack = []
+# number of stages run for each name, used in names of profiles
+_counts = {}
+
+
+def get_rss():
+    """Current resident memory of process in MB. Falls back to peak memory
+    on systems without /proc.
+
+    Returns:
+        float: memory in MB.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, KB elsewhere
+        return rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+
+
+class RssSampler:
+    """Peak resident memory between start and stop, sampled in a thread.
+
+    Examples
+    --------
+    >>> sampler = RssSampler().start()
+    >>> peak = sampler.stop()
+    """
+
+    def __init__(self, interval=interval_rss):
+        self.interval = interval
+        self.peak = 0
+        self.done = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, get_rss())
+
+    def start(self):
+        """Start sampling.
+
+        Returns:
+            RssSampler: self.
+        """
+        self.peak = get_rss()
+        self.done.clear()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling.
+
+        Returns:
+            float: peak memory in MB.
+        """
+        self.done.set()
+        self.thread.join()
+        self.peak = max(self.peak, get_rss())
+        return self.peak
+
+
+class Stage:
+    """Context manager and decorator recording a stage. As decorator, a new
+    record is made for each call and the name defaults to the qualified name
+    of the function.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        # largest peak of allocations of stages inside this one and of this
+        # one before stages inside it reset the peak
+        self.py_peak_inner = 0
+
+    def __call__(self, func):
+        name = self.name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def __enter__(self):
+        self.parent = _stack[-1] if _stack else None
+        _stack.append(self)
+        self.start = dt.datetime.now()
+        self.sampler = RssSampler().start()
+        self.rss_start = self.sampler.peak
+        # allocations
+        if os.environ.get(env_tracemalloc) == '1' and \
+                not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if tracemalloc.is_tracing():
+            self.py_start = tracemalloc.get_traced_memory()[0]
+            # peak of stage needs reset_peak of Python 3.9
+            if hasattr(tracemalloc, 'reset_peak'):
+                # keep peak of stage outside from before reset
+                if self.parent is not None:
+                    self.parent.py_peak_inner = max(
+                        self.parent.py_peak_inner,
+                        tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+        # profile unless a stage outside is already profiled
+        self.profiler = None
+        profiler = os.environ.get(env_profile, '').lower()
+        if profiler and not any(s.profiler for s in _stack[:-1]):
+            self.profiler = self.start_profiler(profiler)
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        if self.profiler is not None:
+            self.stop_profiler()
+        rss_peak = self.sampler.stop()
+        py_delta = py_peak = None
+        if tracemalloc.is_tracing() and hasattr(self, 'py_start'):
+            current, peak = tracemalloc.get_traced_memory()
+            py_delta = (current - self.py_start) / 2 ** 20
+            # without reset_peak, peak is not limited to stage
+            if hasattr(tracemalloc, 'reset_peak'):
+                py_peak = (max(peak, self.py_peak_inner)
+                           - self.py_start) / 2 ** 20
+            if self.parent is not None:
+                self.parent.py_peak_inner = max(self.parent.py_peak_inner,
+                                                peak,
+                                                self.py_peak_inner)
+        _stack.remove(self)
+        records.append({'stage': self.name,
+                        'parent': self.parent.name if self.parent else None,
+                        'depth': len(_stack),
+                        'start': self.start.isoformat(),
+                        'wall': wall,
+                        'cpu': cpu,
+                        'rss_start': self.rss_start,
+                        'rss_peak': rss_peak,
+                        'rss_delta': rss_peak - self.rss_start,
+                        'py_delta': py_delta,
+                        'py_peak': py_peak,
+                        'error': exc_type.__name__ if exc_type else None})
+        logger.debug('Stage {}: wall {:.3f} s, cpu {:.3f} s, peak memory '
+                     + '{:.1f} MB.',
+                     self.name,
+                     wall,
+                     cpu,
+                     rss_peak)
+        return False
+
+    def start_profiler(self, profiler):
+        """Start profiler of stage.
+
+        Args:
+            profiler (str): 'cprofile' or 'pyinstrument'.
+
+        Returns:
+            object: running profiler, None if it is not available.
+        """
+        if profiler == 'cprofile':
+            prof = cProfile.Profile()
+            prof.enable()
+            return prof
+        if profiler == 'pyinstrument':
+            try:
+                import pyinstrument
+            except ImportError:
+                logger.warning('Package pyinstrument is not installed, '
+                               + 'stage {} is not profiled.', self.name)
+                return None
+            prof = pyinstrument.Profiler()
+            prof.start()
+            return prof
+        logger.warning('Unknown profiler {} in {}. Use cprofile or '
+                       + 'pyinstrument.', profiler, env_profile)
+        return None
+
+    def stop_profiler(self):
+        """Stop profiler of stage and save profile."""
+        path = os.path.join(cs.settings.output_dir, folder_profiles)
+        os.makedirs(path, exist_ok=True)
+        _counts[self.name] = _counts.get(self.name, 0) + 1
+        name = '{}_{}'.format(re.sub(r'[^\w.-]', '_', self.name),
+                              _counts[self.name])
+        if isinstance(self.profiler, cProfile.Profile):
+            self.profiler.disable()
+            file = os.path.join(path, name + '.prof')
+            self.profiler.dump_stats(file)
+        else:
+            self.profiler.stop()
+            file = os.path.join(path, name + '.html')
+            with open(file, 'w') as f:
+                f.write(self.profiler.output_html())
+        logger.info('Saved profile of stage {} to {}.', self.name, file)
+
+
+def stage(name=None):
+    """Record a stage, as context manager or decorator.
+
+    Args:
+        name (str or callable, optional): name of stage. Defaults to the
+                                          qualified name of the decorated
+                                          function.
+
+    Returns:
+        Stage: context manager and decorator.
+    """
+    # used as decorator without arguments
+    if callable(name):
+        return Stage()(name)
+    return Stage(name)
+
+
+def get_report():
+    """Records of finished stages.
+
+    Returns:
+        dataframe: records in order of finishing.
+    """
+    return pd.DataFrame(records, columns=columns)
+
+
+def save_report(path=None):
+    """Save records of stages as json and csv. Times are in s and memory in
+    MB. py_delta and py_peak are filled in if tracemalloc is enabled, and
+    py_peak only on Python 3.9 or newer.
+
+    Args:
+        path (str, optional): folder. Defaults to output folder.
+
+    Returns:
+        dataframe: records in order of finishing.
+    """
+    if path is None:
+        path = cs.settings.output_dir
+    os.makedirs(path, exist_ok=True)
+    df = get_report()
+    with open(os.path.join(path, file_report + '.json'), 'w') as f:
+        json.dump(records, f, indent=2)
+    df.to_csv(os.path.join(path, file_report + '.csv'), index=False)
+    logger.info('Saved metrics of {} stages to {}.',
+                df.shape[0],
+                os.path.join(path, file_report + '.json'))
+    return df
@@ -1,12 +1,20 @@
 """Contain function to display or store logging messages."""
+import atexit
 import datetime as dt
 import logging
+import logging.handlers
+import multiprocessing
 import sys
 import os
 from typing import Optional, Union
 
 import eyecontact as cs
 
+# queue with records of all processes in queue mode
+_queue = None
+# listener emitting records from queue in queue mode
+_listener = None
+
 
 def logs(
         show_level: Optional[Union[int, str]] = None,
@@ -15,7 +23,8 @@ def logs(
         path: Optional[str] = None,
         threads: bool = False,
         multiproc: bool = False,
-        show_color: bool = True
+        show_color: bool = True,
+        queue: bool = False
 ) -> None:
     """
     Initialize the logger.
@@ -40,12 +49,21 @@ def logs(
     show_color : bool, default True
         If you have the coloredlogs package installed the messages will be
         colored.
+    queue : bool, default False
+        Send records of all loggers through a queue to a single listener
+        thread, which owns the console and file handlers. Worker processes
+        send their records to the same queue after calling `init_worker`,
+        e.g. as initializer of a process pool (see `worker_init`), so that
+        records of several processes are neither interleaved nor lost.
 
     Note that log levels can be one of the listed strings or an integer between
     1 and 100. If you want to get all possible log messages, use a log level of
     1.
     """
     logger_root = logging.getLogger()
+    # stop listener of previous call
+    _stop_listener()
+    handlers_before = list(logger_root.handlers)
     fmt_items = ('%(asctime)s',
                  '%(levelname)-8s',
                  '%(threadName)s' if threads else None,
@@ -83,9 +101,99 @@ def logs(
         file_handler.setFormatter(formatter)
         file_handler.setLevel(_convert_logging_level(save_level))
         logger_root.addHandler(file_handler)
+    if queue:
+        _start_listener([h for h in logger_root.handlers
+                         if h not in handlers_before])
     _logging_level_threshold()
 
 
+def _start_listener(handlers):
+    """Move handlers from root logger to a listener of a queue, to which the
+    root logger sends its records.
+
+    Args:
+        handlers (list): handlers added by logs.
+    """
+    global _queue, _listener
+    logger_root = logging.getLogger()
+    for handler in handlers:
+        logger_root.removeHandler(handler)
+    _queue = multiprocessing.Queue()
+    _listener = logging.handlers.QueueListener(_queue,
+                                               *handlers,
+                                               respect_handler_level=True)
+    _listener.start()
+    # records below level of all handlers are not sent
+    level = min((h.level for h in handlers), default=logging.WARNING)
+    queue_handler = logging.handlers.QueueHandler(_queue)
+    queue_handler.setLevel(level)
+    logger_root.addHandler(queue_handler)
+    # emit remaining records on exit
+    atexit.register(_stop_listener)
+
+
+def _stop_listener():
+    """Stop listener of queue mode, emitting records left in queue."""
+    global _queue, _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    logger_root = logging.getLogger()
+    for handler in list(logger_root.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger_root.removeHandler(handler)
+    _queue = None
+    _listener = None
+
+
+def init_worker(queue, level=5):
+    """Send records of a worker process to queue of the parent process.
+    Replaces handlers inherited from the parent, if any. Can be used as
+    initializer of a process pool.
+
+    Args:
+        queue (Queue): queue of listener in the parent process.
+        level (int, optional): lowest level of records to send.
+    """
+    logger_root = logging.getLogger()
+    for handler in list(logger_root.handlers):
+        logger_root.removeHandler(handler)
+    queue_handler = logging.handlers.QueueHandler(queue)
+    queue_handler.setLevel(level)
+    logger_root.addHandler(queue_handler)
+    logger_root.setLevel(5)
+    _logging_level_threshold()
+
+
+def worker_init():
+    """Keyword arguments for a process pool to log from workers. Workers send
+    records to the queue of queue mode. Without queue mode, workers started
+    with fork inherit handlers and nothing is needed. Workers started
+    otherwise (spawn, forkserver) have no handlers, so queue mode is started
+    with the handlers of the root logger.
+
+    Examples
+    --------
+    >>> with ProcessPoolExecutor(max_workers=4, **worker_init()) as pool:
+    ...     pool.map(func, items)
+
+    Returns:
+        dict: initializer and its arguments.
+    """
+    if _queue is None:
+        # forked workers inherit handlers
+        if multiprocessing.get_start_method() == 'fork':
+            return {}
+        handlers = [h for h in logging.getLogger().handlers
+                    if not isinstance(h, logging.handlers.QueueHandler)]
+        if not handlers:
+            return {}
+        _start_listener(handlers)
+    level = min((h.level for h in _listener.handlers),
+                default=logging.WARNING)
+    return {'initializer': init_worker, 'initargs': (_queue, level)}
+
+
 def _logging_level_threshold():
     """
     Set the level threshold for a couple of internal and external modules.
@@ -0,0 +1,233 @@
+# by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
+"""Progress and throughput of loops.
+
+Loops count processed items and other units of work (bytes, cells) on a
+Progress object, which reports counts and rates per second to sinks at most
+once per interval instead of after every item. Sinks are callables taking a
+dictionary with the state of progress. Built-in sinks show a tqdm bar, log
+messages or append lines to a JSON metrics file.
+
+Sinks used by default are set by the environment variable
+EYECONTACT_PROGRESS as comma-separated names of sinks ('tqdm', 'log',
+'json') or 'none'. Without it, a tqdm bar is shown if stderr is a terminal,
+and progress is not reported in batch mode.
+
+Examples
+--------
+>>> progress = Progress('heroku.read_data', total=len(rows), unit='rows')
+>>> for row in rows:
+...     progress.update(bytes=len(row))
+>>> progress.close()
+"""
+import json
+import os
+import sys
+import time
+
+import eyecontact as cs
+
+logger = cs.CustomLogger(__name__)  # use custom logger
+
+# environment variable with names of default sinks
+env_sinks = 'EYECONTACT_PROGRESS'
+# file with metrics written by json sink
+file_metrics = 'progress.jsonl'
+# default interval between reports, s
+interval = 1.0
+
+
+class TqdmSink:
+    """Progress bar of tqdm, updated with counts and rates."""
+
+    def __init__(self):
+        self.bar = None
+
+    def __call__(self, state):
+        from tqdm import tqdm
+        if self.bar is None:
+            self.bar = tqdm(desc=state['name'],
+                            total=state['total'],
+                            unit=' ' + state['unit'])
+            # bar starts with first report, rates count from start of loop
+            self.bar.start_t -= state['elapsed']
+        self.bar.update(state['counts'][state['unit']] - self.bar.n)
+        self.bar.set_postfix({unit: '{:.0f}/s'.format(rate)
+                              for unit, rate in state['rates'].items()
+                              if unit != state['unit']},
+                             refresh=False)
+        if state['done']:
+            self.bar.close()
+
+
+class LogSink:
+    """Log messages with counts and rates."""
+
+    def __init__(self, level='info'):
+        self.level = level
+
+    def __call__(self, state):
+        counts = ', '.join('{} {}'.format(count, unit)
+                           for unit, count in state['counts'].items())
+        rates = ', '.join('{:.1f} {}/s'.format(rate, unit)
+                          for unit, rate in state['rates'].items())
+        total = '/{}'.format(state['total']) if state['total'] else ''
+        getattr(logger, self.level)('{}: {}{} {} ({}) in {:.1f} s{}.',
+                                    state['name'],
+                                    state['counts'][state['unit']],
+                                    total,
+                                    state['unit'],
+                                    rates or counts,
+                                    state['elapsed'],
+                                    ', done' if state['done'] else '')
+
+
+class JsonSink:
+    """Lines with state of progress appended to a JSON lines file."""
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def __call__(self, state):
+        path = self.path
+        if path is None:
+            path = os.path.join(cs.settings.output_dir, file_metrics)
+        with open(path, 'a') as f:
+            f.write(json.dumps(dict(state, time=time.time())) + '\n')
+
+
+# sinks by name
+sinks_available = {'tqdm': TqdmSink, 'log': LogSink, 'json': JsonSink}
+
+
+def get_default_sinks():
+    """Names of sinks used when none are given.
+
+    Returns:
+        list: names of sinks.
+    """
+    names = os.environ.get(env_sinks)
+    if names is None:
+        # no progress in batch mode
+        return ['tqdm'] if sys.stderr.isatty() else []
+    return [name.strip() for name in names.split(',')
+            if name.strip() and name.strip() != 'none']
+
+
+class Progress:
+    """Counts of processed units of a loop, reported to sinks at most once
+    per interval and when closed.
+    """
+
+    def __init__(self, name, total=None, unit='rows', sinks=None,
+                 interval=interval):
+        """
+        Args:
+            name (str): name of loop.
+            total (int, optional): expected number of items.
+            unit (str, optional): unit of items.
+            sinks (list, optional): names of sinks or callables taking state
+                                    of progress. Defaults to
+                                    get_default_sinks().
+            interval (float, optional): minimal time between reports, s.
+        """
+        self.name = name
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        if sinks is None:
+            sinks = get_default_sinks()
+        self.sinks = []
+        for sink in sinks:
+            if isinstance(sink, str):
+                if sink not in sinks_available:
+                    logger.warning('Unknown progress sink {}. Use one of '
+                                   + '{}.', sink, list(sinks_available))
+                    continue
+                sink = sinks_available[sink]()
+            self.sinks.append(sink)
+        self.counts = {unit: 0}
+        self.start = time.perf_counter()
+        # time of next report
+        self.next = self.start + interval
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def update(self, n=1, **counts):
+        """Add processed items and other units, e.g. bytes=100.
+
+        Args:
+            n (int, optional): number of items.
+            **counts: numbers of other units.
+        """
+        self.counts[self.unit] += n
+        for unit, count in counts.items():
+            self.counts[unit] = self.counts.get(unit, 0) + count
+        if self.sinks:
+            now = time.perf_counter()
+            if now >= self.next:
+                self.next = now + self.interval
+                self.report(now)
+
+    def wrap(self, iterable):
+        """Iterate over items, counting each of them, and close when
+        iteration ends.
+
+        Args:
+            iterable (iterable): items.
+
+        Yields:
+            object: items.
+        """
+        try:
+            for item in iterable:
+                yield item
+                self.update()
+        finally:
+            self.close()
+
+    def get_state(self, now=None):
+        """State of progress given to sinks.
+
+        Args:
+            now (float, optional): time from time.perf_counter.
+
+        Returns:
+            dict: name, unit, total, counts, elapsed time, rates per second
+                  and flag of end.
+        """
+        if now is None:
+            now = time.perf_counter()
+        elapsed = now - self.start
+        rates = {unit: count / elapsed if elapsed > 0 else 0.0
+                 for unit, count in self.counts.items()}
+        return {'name': self.name,
+                'unit': self.unit,
+                'total': self.total,
+                'counts': dict(self.counts),
+                'elapsed': elapsed,
+                'rates': rates,
+                'done': self.closed}
+
+    def report(self, now=None):
+        """Send state of progress to sinks.
+
+        Args:
+            now (float, optional): time from time.perf_counter.
+        """
+        state = self.get_state(now)
+        for sink in self.sinks:
+            sink(state)
+
+    def close(self):
+        """Send final state to sinks."""
+        if self.closed:
+            return
+        self.closed = True
+        if self.sinks:
+            self.report()
@@ -3,10 +3,11 @@ import matplotlib.pyplot as plt
 import matplotlib._pylab_helpers
 import datetime as dt
 import numpy as np
+import pandas as pd
 
 import eyecontact as cs
 
-cs.logs(show_level='info', show_color=True)
+cs.logs(show_level='info', show_color=True, queue=True)
 logger = cs.CustomLogger(__name__)  # use custom logger
 
 # Const
@@ -14,10 +15,16 @@ SAVE_P = True  # save pickle files with data
 LOAD_P = False  # load pickle files with data
 SAVE_CSV = True  # load csv files with data
 FILTER_DATA = True  # filter Appen and heroku data
+PUSHDOWN_FILTERS = True  # skip people filtered in Appen data in heroku data
 CLEAN_DATA = True  # clean Appen data
 REJECT_CHEATERS = True  # reject cheaters on Appen
 UPDATE_MAPPING = True  # update mapping with keypress data
 SHOW_OUTPUT = True  # shoud figures be plotted
+OUTPUT_MODE = 'shared'  # mode of saving figures: html, shared, json
+REFRESH_FIGURES = False  # rebuild figures even if input data did not change
+KP_MAX_POINTS = 2000  # max points per keypress trace, None to keep all
+HEADLESS = None  # render without display, None to detect
+STATIC_FORMATS = []  # formats for static export of figures, e.g. ['png']
 
 # for debugging, skip processing
 # SAVE_P = False  # save pickle files with data
@@ -32,44 +39,41 @@ SHOW_OUTPUT = True  # shoud figures be plotted
 file_mapping = 'mapping.p'  # file to save updated mapping
 
 if __name__ == '__main__':
-    # create object for working with heroku data
-    files_heroku = cs.common.get_configs('files_heroku')
-    heroku = cs.analysis.Heroku(files_data=files_heroku,
-                                save_p=SAVE_P,
-                                load_p=LOAD_P,
-                                save_csv=SAVE_CSV)
-    # read heroku data
-    heroku_data = heroku.read_data(filter_data=FILTER_DATA)
     # create object for working with appen data
     file_appen = cs.common.get_configs('file_appen')
     appen = cs.analysis.Appen(file_data=file_appen,
                               save_p=SAVE_P,
                               load_p=LOAD_P,
                               save_csv=SAVE_CSV)
-    # read appen data
+    # read appen data first, people filtered in it are not parsed in heroku
+    # data
     appen_data = appen.read_data(filter_data=FILTER_DATA,
                                  clean_data=CLEAN_DATA)
-    # get keys in data files
-    heroku_data_keys = heroku_data.keys()
-    appen_data_keys = appen_data.keys()
+    # create object for working with heroku data
+    files_heroku = cs.common.get_configs('files_heroku')
+    heroku = cs.analysis.Heroku(files_data=files_heroku,
+                                save_p=SAVE_P,
+                                load_p=LOAD_P,
+                                save_csv=SAVE_CSV)
+    # read heroku data
+    heroku_data = heroku.read_data(filter_data=FILTER_DATA,
+                                   exclude=appen.excluded if PUSHDOWN_FILTERS else None)  # noqa: E501
     # flag and reject cheaters
     if REJECT_CHEATERS:
         qa = cs.analysis.QA(file_cheaters=cs.common.get_configs('file_cheaters'),  # noqa: E501
                             job_id=cs.common.get_configs('appen_job'))
         qa.flag_users()
         qa.reject_users()
-    # merge heroku and appen dataframes into one
-    all_data = heroku_data.merge(appen_data,
-                                 left_on='worker_code',
-                                 right_on='worker_code')
+    # participants present in both heroku and appen data
+    participants = cs.analysis.Participants()
+    participants.add('heroku', heroku_data)
+    participants.add('appen', appen_data)
     logger.info('Data from {} participants included in analysis.',
-                all_data.shape[0])
+                len(participants))
     # update original data files
-    heroku_data = all_data[all_data.columns.intersection(heroku_data_keys)]
-    heroku_data = heroku_data.set_index('worker_code')
+    heroku_data = participants.get('heroku')
     heroku.set_data(heroku_data)  # update object with filtered data
-    appen_data = all_data[all_data.columns.intersection(appen_data_keys)]
-    appen_data = appen_data.set_index('worker_code')
+    appen_data = participants.get('appen')
     appen.set_data(appen_data)  # update object with filtered data
     appen.show_info()  # show info for filtered data
     # generate country-specific data
@@ -93,7 +97,11 @@ if __name__ == '__main__':
                                         'mapping of stimuli')
     if SHOW_OUTPUT:
         # Output
-        analysis = cs.analysis.Analysis()
+        analysis = cs.analysis.Analysis(output_mode=OUTPUT_MODE,
+                                        force_refresh=REFRESH_FIGURES,
+                                        kp_max_points=KP_MAX_POINTS,
+                                        headless=HEADLESS,
+                                        static_formats=STATIC_FORMATS)
         logger.info('Creating figures.')
         # all keypresses with confidence interval
         analysis.plot_kp(mapping, conf_interval=0.95)
@@ -132,7 +140,7 @@ if __name__ == '__main__':
                                        conf_interval=0.95)
         # columns to drop in correlation matrix and scatter matrix
         columns_drop = ['no', 'scenario', 'speed', 'video_length', 'kp',
-                        'min_dur', 'max_dur']
+                        'kp_pp', 'min_dur', 'max_dur']
         # set nan to -1
         df = mapping
         df = df.fillna(-1)
@@ -149,7 +157,7 @@ if __name__ == '__main__':
                                 save_file=True)
         # stimulus duration
         analysis.hist(heroku_data,
-                      x=heroku_data.columns[heroku_data.columns.to_series().str.contains('-dur')],  # noqa: E501
+                      x=heroku_data.columns[heroku.get_positions('dur')],
                       nbins=100,
                       pretty_text=True,
                       save_file=True)
@@ -178,9 +186,14 @@ if __name__ == '__main__':
                         'end': dt.datetime(2021, 10, 1, 00, 00, 00, 000,
                                            tzinfo=dt.timezone.utc)
                         }]
+        # durations with start times of participants, frames share index
+        all_data = pd.concat([heroku_data.iloc[:, heroku.get_positions('dur')],
+                              appen_data['start']],
+                             axis=1)
         analysis.hist_stim_duration_time(all_data,
                                          time_ranges=time_ranges,
                                          nbins=100,
+                                         columns_index=heroku.columns_index,
                                          save_file=True)
         # browser window dimensions
         analysis.scatter(heroku_data,
@@ -305,6 +318,11 @@ if __name__ == '__main__':
         analysis.map(countries_data, color='year_license', save_file=True)
         # map of year of automated driving per country
         analysis.map(countries_data, color='year_ad', save_file=True)
+        # page for browsing all figures
+        analysis.save_index()
+        # static files of figures
+        if STATIC_FORMATS:
+            analysis.export_static()
         # check if any figures are to be rendered
         figures = [manager.canvas.figure
                    for manager in
@@ -312,3 +330,5 @@ if __name__ == '__main__':
         # show figures, if any
         if figures:
             plt.show()
+    # time and memory of stages
+    cs.instrument.save_report()
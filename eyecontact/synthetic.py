@@ -0,0 +1,414 @@
+# by Pavlo Bazilinskyy <pavlo.bazilinskyy@gmail.com>
+"""Synthetic data for load testing.
+
+Writes data shaped as the output of the experiment for a given number of
+participants: Heroku data with a JSON row per saved batch of jsPsych trials,
+Appen export with its original column names and mapping of stimuli. Data is
+random, but follows the structure that Heroku.read_data, Appen.read_data and
+the filters expect, including key holds, repetitions, injected questions and
+browser interactions. Results depend only on the seed.
+
+Example:
+    python -m eyecontact.synthetic --participants 10000 --out _synthetic
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import numpy as np
+import pandas as pd
+
+import eyecontact as cs
+
+logger = cs.CustomLogger(__name__)  # use custom logger
+
+# file with heroku data
+file_heroku = 'heroku.json'
+# file with appen data
+file_appen = 'appen.csv'
+# file with mapping of stimuli
+file_mapping = 'mapping.csv'
+# number of videos between saving of data
+num_videos_break = 10
+# interval between repeated keydown events when key is held, ms
+key_repeat = 30
+# scenarios in mapping
+scenarios = ['yielding_noeyecontact',
+             'yielding_eyecontact_start_to_stop',
+             'yielding_eyecontact_stop_to_takeoff',
+             'nonyielding_noeyecontact',
+             'nonyielding_eyecontact']
+# answers of appen questions, by readable name of column
+appen_options = {
+    'milage': ['0_km__mi', '1__1000_km_1__621_mi',
+               '1001__5000_km_622__3107_mi', '5001__15000_km_3108__9321_mi',
+               'more_than_100000_km'],
+    'instructions': ['yes'],
+    'accidents': ['0', '1', '2', '3', 'i_prefer_not_to_respond'],
+    'driving_freq': ['never', 'less_than_once_a_month',
+                     'once_a_month_to_once_a_week', '1_to_3_days_a_week',
+                     '4_to_6_days_a_week', 'every_day'],
+    'place': ['home', 'work', 'public_place', 'other'],
+    'gender': ['female', 'male', 'i_prefer_not_to_respond'],
+    'mode_transportation': ['private_vehicle', 'public_transportation',
+                            'walkingcycling', 'motorcycle'],
+    'device': ['laptop', 'desktop_computer', 'other'],
+    'ec_driver': ['i_can_cross', 'i_should_wait', 'nothing'],
+    'ec_pedestrian': ['i_can_cross', 'i_should_wait', 'nothing'],
+    'ec_importance': ['1', '2', '3', '4', '5'],
+    'eyesight': ['very_poor', 'poor', 'fair', 'good', 'very_good'],
+    'pedestrian': ['never', 'rarely', 'sometimes', 'often', 'every_day']}
+# answers to dbq questions
+dbq_options = ['0_times_per_month', '1_to_3_times_in_a_year',
+               '4_to_6_times_in_a_year', '7_to_11_times_in_a_year',
+               '1_to_4_times_in_a_month', '5_to_10_times_in_a_month',
+               'more_than_10_times_in_a_month']
+# countries of participants
+countries = ['VEN', 'USA', 'IND', 'EGY', 'RUS', 'TUR', 'GBR', 'BRA', 'ITA',
+             'DZA']
+# browsers of participants
+browsers = ['Chrome', 'Firefox', 'Opera', 'Edge']
+
+
+def generate_mapping(num_stimuli, rng):
+    """Mapping of stimuli with the columns of the original mapping.
+
+    Args:
+        num_stimuli (int): number of stimuli.
+        rng (Generator): random numbers.
+
+    Returns:
+        dataframe: mapping.
+    """
+    video_length = rng.choice([21000, 26000, 31000], size=num_stimuli)
+    start_ec = np.round(rng.uniform(0, 10, num_stimuli), 2)
+    end_ec = np.round(start_ec + rng.uniform(1, 8, num_stimuli), 2)
+    no_ec = rng.random(num_stimuli) < 0.25
+    start_ec[no_ec] = np.nan
+    end_ec[no_ec] = np.nan
+    start_dec = np.round(rng.uniform(5, 15, num_stimuli), 2)
+    end_dec = np.round(start_dec + rng.uniform(2, 5, num_stimuli), 2)
+    takeoff = np.round(end_dec + rng.uniform(2, 6, num_stimuli), 2)
+    return pd.DataFrame({
+        'no': np.arange(num_stimuli),
+        'scenario': rng.choice(scenarios, size=num_stimuli),
+        'video_id': ['video_' + str(i) for i in range(num_stimuli)],
+        'yielding': rng.integers(0, 2, num_stimuli),
+        'speed': rng.choice([15, 30, 50], size=num_stimuli),
+        'deceleration': -rng.integers(1, 4, num_stimuli),
+        'start_deceleration_dist': rng.integers(10, 40, num_stimuli),
+        'start_deceleration_time': start_dec,
+        'end_deceleration_time': end_dec,
+        'full_stop_dist': np.round(rng.uniform(5, 20, num_stimuli), 1),
+        'start_fullstop': end_dec,
+        'end_fullstop': takeoff,
+        'acceleration': rng.integers(1, 3, num_stimuli),
+        'takeoff': takeoff,
+        'start_ec': start_ec,
+        'end_ec': end_ec,
+        'dur_ec': np.round(end_ec - start_ec, 2),
+        'video_length': video_length,
+        'min_dur': video_length - 2000,
+        'max_dur': video_length + 2000})
+
+
+def generate_rts(video_length, rng):
+    """Keypress data of a single video. Each press is held for some time,
+    during which the browser repeats keydown events.
+
+    Args:
+        video_length (int): length of video in ms.
+        rng (Generator): random numbers.
+
+    Returns:
+        list: dictionaries with pressed key and response time.
+    """
+    # presses as start times and durations
+    num_presses = rng.poisson(2)
+    if not num_presses:
+        return []
+    starts = np.sort(rng.uniform(0, video_length, num_presses))
+    holds = rng.exponential(2000, num_presses)
+    # repeated keydown events during each hold
+    counts = (holds // key_repeat).astype(int) + 1
+    offsets = (np.arange(counts.sum())
+               - np.repeat(np.cumsum(counts) - counts, counts)) * key_repeat
+    rts = np.repeat(starts, counts) + offsets
+    rts += rng.uniform(-3, 3, len(rts))
+    rts = np.round(np.sort(rts[rts < video_length]), 1)
+    return [{'key': 'f', 'rt': rt} for rt in rts.tolist()]
+
+
+def generate_participant(worker_code, mapping, num_repeat, injections,
+                         injections_answers, p_mistake, rng):
+    """Rows of heroku data of a single participant. Data is saved after every
+    num_videos_break videos, as in the experiment.
+
+    Args:
+        worker_code (str): code of participant.
+        mapping (dataframe): mapping of stimuli.
+        num_repeat (int): number of repetitions of each stimulus.
+        injections (list): injected questions.
+        injections_answers (list): correct answers to injected questions.
+        p_mistake (float): probability of wrong answer to injection.
+        rng (Generator): random numbers.
+
+    Returns:
+        list: rows of heroku data as dictionaries.
+    """
+    num_stimuli = mapping.shape[0]
+    video_length = mapping['video_length'].values
+    # order of videos
+    video_ids = rng.permutation(np.repeat(np.arange(num_stimuli),
+                                          num_repeat)).tolist()
+    num_videos = len(video_ids)
+    # videos followed by injected question
+    num_injections = min(len(injections), num_videos)
+    injected = dict(zip(rng.choice(num_videos, num_injections,
+                                   replace=False).tolist(),
+                        rng.permutation(len(injections))[:num_injections]
+                        .tolist()))
+    # durations of videos as measured in browser, some are off
+    durations = video_length[video_ids] + rng.normal(300, 400, num_videos)
+    wrong = rng.random(num_videos) < 0.03
+    durations[wrong] += rng.uniform(3000, 20000, wrong.sum())
+    rows = []
+    cells = []
+    interactions = []
+    trial = 0
+    elapsed = 0.0
+    browser = browsers[rng.integers(len(browsers))]
+
+    def add_cell(cell, duration):
+        nonlocal trial, elapsed
+        elapsed += duration
+        cell.update({'trial_index': trial,
+                     'time_elapsed': round(elapsed),
+                     'internal_node_id': '0.0-' + str(trial) + '.0'})
+        cells.append(cell)
+        trial += 1
+
+    def save():
+        nonlocal cells, interactions
+        cells[-1].update({'worker_code': worker_code,
+                          'interactions': interactions,
+                          'window_width': int(rng.choice([1366, 1536, 1920])),
+                          'window_height': int(rng.choice([657, 768, 937]))})
+        rows.append({'data': cells})
+        cells = []
+        interactions = []
+
+    # instructions with meta information
+    add_cell({'trial_type': 'html-keyboard-response',
+              'stimulus': '<p>Instructions</p>',
+              'rt': 20000,
+              'browser_name': browser,
+              'browser_full_version': '90.0.4430.85',
+              'browser_major_version': 90,
+              'browser_app_name': 'Netscape',
+              'browser_user_agent': 'Mozilla/5.0 ' + browser,
+              'video_ids': video_ids,
+              'window_height_init': 937,
+              'window_width_init': 1920}, 20000)
+    add_cell({'trial_type': 'audio-keyboard-response',
+              'stimulus': ['sound/test_1.wav'],
+              'rt': 15000}, 15000)
+    for i, video in enumerate(video_ids):
+        add_cell({'trial_type': 'html-keyboard-response',
+                  'stimulus': '<p>Press C to continue.</p>',
+                  'rt': 1000}, 1000)
+        add_cell({'trial_type': 'html-keyboard-response',
+                  'stimulus': '<img src="img/black_frame.png"/>',
+                  'rt': 500}, 500)
+        add_cell({'trial_type': 'video-keyboard-multiple-responses-release',
+                  'stimulus': ['videos/video_' + str(video) + '.mp4'],
+                  'rts': generate_rts(int(video_length[video]), rng)},
+                 float(durations[i]))
+        # participant leaving window during video
+        if rng.random() < 0.05:
+            interactions.append({'event': 'blur',
+                                 'trial': trial - 1,
+                                 'time': round(elapsed - 1000)})
+            interactions.append({'event': 'focus',
+                                 'trial': trial - 1,
+                                 'time': round(elapsed - 500)})
+        # questions after video
+        responses = {'eye_contact': int(rng.integers(0, 2)),
+                     'intuitive': int(rng.integers(0, 5))}
+        question_order = '[0,1]'
+        injection_q = 'na'
+        if i in injected:
+            injection_q = injections[injected[i]]
+            answer = injections_answers[injected[i]]
+            if rng.random() < p_mistake:
+                answer = 1 - answer
+            responses['injection'] = answer
+            question_order = '[0,1,2]'
+        add_cell({'trial_type': 'survey-likert',
+                  'responses': json.dumps(responses, separators=(',', ':')),
+                  'question_order': question_order,
+                  'injection_q': injection_q,
+                  'rt': int(rng.integers(2000, 8000))}, 4000)
+        # save data in breaks
+        if (i + 1) % num_videos_break == 0 and i + 1 < num_videos:
+            save()
+    # questions in the end
+    responses = {'importance': int(rng.integers(0, 5)),
+                 'preference': int(rng.integers(0, 5)),
+                 'concentration': int(rng.integers(0, 5))}
+    add_cell({'trial_type': 'survey-likert',
+              'responses': json.dumps(responses, separators=(',', ':')),
+              'question_order': '[0,1,2]',
+              'rt': 10000}, 10000)
+    save()
+    return rows
+
+
+def generate_appen(worker_codes, starts, durations, p_cheater, rng):
+    """Appen export with original column names.
+
+    Args:
+        worker_codes (list): codes of participants.
+        starts (ndarray): times of start in s since epoch.
+        durations (ndarray): durations of participation in s.
+        p_cheater (float): share of participants who reuse a worker code or
+                           an IP address.
+        rng (Generator): random numbers.
+
+    Returns:
+        dataframe: appen data.
+    """
+    n = len(worker_codes)
+    # readable names to original names. For names with several original
+    # names the last one is used
+    columns = {v: k for k, v in cs.analysis.Appen.columns_mapping.items()}
+    started = pd.to_datetime(starts, unit='s')
+    created = pd.to_datetime(starts + durations, unit='s')
+    codes = np.array(worker_codes, dtype=object)
+    ips = np.array(['10.' + str(i // 65536 % 256) + '.' + str(i // 256 % 256)
+                    + '.' + str(i % 256) for i in range(n)], dtype=object)
+    # cheaters reuse code or ip of another participant
+    cheaters = np.flatnonzero(rng.random(n) < p_cheater)
+    if n > 1 and len(cheaters):
+        others = rng.integers(0, n, len(cheaters))
+        reuse_code = rng.random(len(cheaters)) < 0.5
+        codes[cheaters[reuse_code]] = codes[others[reuse_code]]
+        ips[cheaters[~reuse_code]] = ips[others[~reuse_code]]
+    data = {
+        '_unit_id': 3000000000 + np.arange(n),
+        '_created_at': created.strftime('%m/%d/%Y %H:%M:%S'),
+        '_id': 6000000000 + np.arange(n),
+        '_started_at': started.strftime('%m/%d/%Y %H:%M:%S'),
+        '_tainted': False,
+        '_channel': 'neodev',
+        '_trust': 1,
+        '_worker_id': 40000000 + rng.permutation(n),
+        '_country': rng.choice(countries, n),
+        '_region': '',
+        '_city': '',
+        '_ip': ips,
+        columns['worker_code']: codes,
+        'worker_code': '',
+        columns['age']: rng.integers(16, 70, n),
+        columns['year_license']: rng.integers(16, 40, n),
+        columns['year_ad']: rng.integers(2025, 2080, n),
+        columns['age'] + '_gold': ''}
+    for name, options in appen_options.items():
+        data[columns[name]] = rng.choice(options, n)
+    for name in ['dbq1_anger', 'dbq2_speed_motorway',
+                 'dbq3_speed_residential', 'dbq4_headway',
+                 'dbq5_traffic_lights', 'dbq6_horn', 'dbq7_mobile']:
+        data[columns[name]] = rng.choice(dbq_options, n)
+    for name in ['place_other', 'device_other', 'suggestions_ad']:
+        data[columns[name]] = ''
+    # few people do not read instructions
+    instructions = data[columns['instructions']]
+    instructions[rng.random(n) < 0.01] = 'no'
+    return pd.DataFrame(data)
+
+
+def generate(num_participants, out_dir, seed=None, num_stimuli=None,
+             num_repeat=None, p_mistake=0.05, p_cheater=0.02):
+    """Write heroku data, appen data and mapping of stimuli for a number of
+    participants.
+
+    Args:
+        num_participants (int): number of participants.
+        out_dir (str): folder for output files.
+        seed (int, optional): seed for random numbers.
+        num_stimuli (int, optional): number of stimuli. Defaults to value in
+                                     config.
+        num_repeat (int, optional): number of repetitions of each stimulus.
+                                    Defaults to value in config.
+        p_mistake (float, optional): probability of wrong answer to injected
+                                     question.
+        p_cheater (float, optional): share of participants who reuse a worker
+                                     code or an IP address in appen data.
+
+    Returns:
+        dict: paths to files with heroku data, appen data and mapping.
+    """
+    if num_stimuli is None:
+        num_stimuli = cs.common.get_configs('num_stimuli')
+    if num_repeat is None:
+        num_repeat = cs.common.get_configs('num_repeat')
+    injections = cs.common.get_configs('injections')
+    injections_answers = cs.common.get_configs('injections_answers')
+    rng = np.random.default_rng(seed)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    paths = {'heroku': os.path.join(out_dir, file_heroku),
+             'appen': os.path.join(out_dir, file_appen),
+             'mapping': os.path.join(out_dir, file_mapping)}
+    logger.info('Generating synthetic data of {} participants in {}.',
+                num_participants,
+                out_dir)
+    # mapping
+    mapping = generate_mapping(num_stimuli, rng)
+    mapping.to_csv(paths['mapping'], index=False)
+    # times of participation
+    first = dt.datetime(2021, 4, 1, tzinfo=dt.timezone.utc).timestamp()
+    starts = first + np.sort(rng.uniform(0, 180 * 24 * 3600,
+                                         num_participants))
+    durations = rng.normal(1800, 400, num_participants).clip(60)
+    worker_codes = ['W7' + str(int(s * 1000)) + 'HF' + str(i) + '2J'
+                    for i, s in enumerate(starts)]
+    # heroku data, written row by row
+    num_rows = 0
+    with open(paths['heroku'], 'w') as f:
+        for worker_code in worker_codes:
+            rows = generate_participant(worker_code,
+                                        mapping,
+                                        num_repeat,
+                                        injections,
+                                        injections_answers,
+                                        p_mistake,
+                                        rng)
+            for row in rows:
+                f.write(json.dumps(row, separators=(',', ':')))
+                f.write('\n')
+            num_rows += len(rows)
+    logger.info('Wrote {} rows of heroku data to {}.', num_rows,
+                paths['heroku'])
+    # appen data
+    generate_appen(worker_codes,
+                   starts,
+                   durations,
+                   p_cheater,
+                   rng).to_csv(paths['appen'], index=False)
+    logger.info('Wrote appen data to {}.', paths['appen'])
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic data.')
+    parser.add_argument('--participants', type=int, default=1000,
+                        help='number of participants')
+    parser.add_argument('--out', default=os.path.join(cs.settings.root_dir,
+                                                      '_synthetic'),
+                        help='folder for output files')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for random numbers')
+    args = parser.parse_args()
+    cs.logs(show_level='info', show_color=True)
+    generate(args.participants, args.out, seed=args.seed)